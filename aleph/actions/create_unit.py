@@ -16,6 +16,8 @@
 import random
 import logging
 
+import numpy as np
+
 from aleph.data_structures.unit import Unit
 import aleph.const as consts
 
@@ -29,7 +31,7 @@ def _nonforking_creator(poset, V):
     return len(poset.max_units_per_process[V.creator_id]) == 1
 
 def _parent_candidates(poset, parents, level):
-    return list(reversed([V for V in poset.max_units if V.level == level and V not in parents and _nonforking_creator(poset, V)]))
+    return [V for V in reversed(poset.max_units_by_level.get(level, {})) if V not in parents and _nonforking_creator(poset, V)]
 
 def _combine_parents(parents, new_parents):
     if not new_parents:
@@ -41,6 +43,23 @@ def _combine_parents(parents, new_parents):
 
 def _pick_more_parents(poset, parents, level, num_parents):
     parent_candidates = _parent_candidates(poset, parents, level)
+    if any(len(Vs) > 1 for Vs in poset.get_prime_units_by_level_per_process(level)):
+        return _pick_more_parents_forked(poset, parents, level, num_parents, parent_candidates)
+    # every process has at most one prime unit at this level, hence sets of prime units can be represented as masks of processes
+    non_visible_primes = np.array([len(Vs) == 1 for Vs in poset.get_prime_units_by_level_per_process(level)])
+    for V in parents:
+        non_visible_primes &= ~poset.prime_below_mask(level, V)
+    new_parents = []
+    for V in parent_candidates:
+        if len(new_parents) + len(parents) == num_parents:
+            return _combine_parents(parents, new_parents)
+        visible_primes = poset.prime_below_mask(level, V)
+        if (non_visible_primes & visible_primes).any():
+            new_parents.append(V)
+            non_visible_primes &= ~visible_primes
+    return _combine_parents(parents, new_parents)
+
+def _pick_more_parents_forked(poset, parents, level, num_parents, parent_candidates):
     non_visible_primes = poset.get_all_prime_units_by_level(level)
     for V in parents:
         non_visible_primes = [W for W in non_visible_primes if not poset.below(W, V)]
@@ -45,24 +45,25 @@ def order_units_topologically(units_list):
     :returns: topologically sorted unit_list
     '''
 
-    state = {U: 0 for U in units_list}
+    # units are identified by their ids in the poset
+    state = {U.id: 0 for U in units_list}
     top_list = []
     unit_stack = []
     for U in units_list:
-        if state[U] == 0:
+        if state[U.id] == 0:
             unit_stack.append(U)
 
         while unit_stack:
             V = unit_stack.pop()
-            if state[V] == 0:
-                state[V] = 1
+            if state[V.id] == 0:
+                state[V.id] = 1
                 unit_stack.append(V)
                 for W in V.parents:
-                    if W in state and state[W] == 0:
+                    if state.get(W.id) == 0:
                         unit_stack.append(W)
-            elif state[V] == 1:
+            elif state[V.id] == 1:
                 top_list.append(V)
-                state[V] = 2
+                state[V.id] = 2
 
     return top_list
 
@@ -82,17 +83,40 @@ def units_to_send_with_pid(poset, tops, pid):
     local_max = poset.max_units_per_process[pid]
     local_max.sort(key=lambda U: U.height)
     min_remote_height = min([t[0] for t in tops]) if len(tops) > 0 else -1
-    remote_hashes = [t[1] for t in tops]
+    nonforking = poset.forking_height[pid] == float('inf')
 
     for U in local_max:
+        # find the highest remote top below U using skip pointers, so that we touch only the units that are actually sent
+        known = [height for height, V_hash in tops if height <= U.height and _hash_or_none(U.ancestor(height)) == V_hash]
+        if known:
+            known_height = max(known)
+        elif min_remote_height <= 0:
+            # the other poset does not know any unit of this chain, we send all of it
+            known_height = -1
+        else:
+            continue
+        if nonforking:
+            # all units of pid form a chain, hence the units to send are exactly the units in a range of heights
+            possibly_send = poset.units_by_process_in_range(pid, known_height, U.height)
+            # if some units in the range were pruned from the poset, the other poset is too far behind to be synced
+            if len(possibly_send) == U.height - known_height:
+                to_send.extend(possibly_send)
+            continue
         possibly_send = []
-        while U is not None and U.height >= min_remote_height and U.hash() not in remote_hashes:
+        while U is not None and U.height > known_height:
+            if U.hash() not in poset.units:
+                # U was pruned from the poset, the other poset is too far behind to be synced
+                break
             possibly_send.append(U)
             U = U.self_predecessor
-        if U is None or U.hash() in remote_hashes:
+        else:
             to_send.extend(possibly_send)
 
-    return to_send, [h for h in remote_hashes if h not in poset.units]
+    return to_send, [V_hash for _, V_hash in tops if V_hash not in poset.units]
+
+
+def _hash_or_none(U):
+    return U.hash() if U is not None else None
 
 
 def _drop_to_height(units, height):
@@ -100,9 +124,10 @@ def _drop_to_height(units, height):
         return set()
     result = set()
     for U in units:
-        while U.height > height:
-            U = U.self_predecessor
-        result.add(U)
+        # the ancestor of a unit is None if the chain below it was pruned
+        U = U.ancestor(height) if U.height > height else U
+        if U is not None:
+            result.add(U)
 
     return result
 
@@ -121,7 +146,21 @@ def requested_units_to_send(poset, tops, requests):
         return []
 
     to_send = []
-    requested = set(poset.units[h] for h in requests)
+    requested = set(poset.units[h] for h in requests if h in poset.units)
+    if not requested:
+        return []
+
+    pid = next(iter(requested)).creator_id
+    if poset.forking_height[pid] == float('inf') and all(U.creator_id == pid for U in requested):
+        # pid does not fork, hence all its units form a chain: we send the requested units together with all the units below them
+        # down to the highest unit known to the other poset, including that unit
+        known_height = max([t[0] for t in tops if t[1] in poset.units], default = -1)
+        top_height = max(U.height for U in requested)
+        low = max(known_height, 0) if top_height > known_height else top_height + 1
+        to_send = poset.units_by_process_in_range(pid, low - 1, top_height)
+        to_send.extend(U for U in requested if U.height < low)
+        return to_send
+
     known_remotes = set(poset.units[t[1]] for t in tops if t[1] in poset.units)
     operation_height = max(U.height for U in requested)
     known_remotes = _drop_to_height(known_remotes, operation_height)
@@ -129,10 +168,13 @@ def requested_units_to_send(poset, tops, requests):
     while requested:
         considered_requests = set(U for U in requested if U.height == operation_height)
         for U in considered_requests:
+            requested.remove(U)
+            if U.hash() not in poset.units:
+                # U was pruned from the poset, we cannot send it
+                continue
             to_send.append(U)
             if U not in known_remotes and U.self_predecessor is not None:
                 requested.add(U.self_predecessor)
-            requested.remove(U)
         operation_height -= 1
         known_remotes = _drop_to_height(known_remotes, operation_height)
 
@@ -158,7 +200,7 @@ def units_to_send(poset, info, requests=None):
         pid_to_send, pid_my_requests = units_to_send_with_pid(poset, info[pid], pid)
         to_send.extend(pid_to_send)
         my_requests.append(pid_my_requests)
-        hashes_to_send = [U.hash() for U in pid_to_send]
+        hashes_to_send = set(U.hash() for U in pid_to_send)
         unfulfilled_requests = [h for h in requests[pid] if h not in hashes_to_send]
         to_send.extend(requested_units_to_send(poset, info[pid], unfulfilled_requests))
 
@@ -168,17 +210,19 @@ def units_to_send(poset, info, requests=None):
 def dehash_parents(poset, U):
     '''
     Substitute units from the poset for hashes in U's parent list and set the height field. To be called on units received from the network.
+    Some parents might be missing in the poset, if they were pruned from it.
 
     :param Poset poset: the poset where U is supposed to end up in
     :param Unit U: the unit with hashes instead of parents
+    :returns: True if all the parents were found in the poset, False otherwise
     '''
 
     if not all(p in poset.units for p in U.parents):
         strangers = [pretty_hash(parent_hash) for parent_hash in U.parents if parent_hash not in poset.units]
         logger = logging.getLogger(consts.LOGGER_NAME)
         logger.error(f'dehash_parents {poset.process_id} | Parents {strangers} not found in the poset for {U.short_name()}')
-
-        assert False, 'Attempting to fix parents but parents not present in poset'
+        return False
 
     U.parents = [poset.units[p] for p in U.parents]
     U.height = U.parents[0].height+1 if U.parents else 0
+    return True
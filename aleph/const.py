@@ -22,15 +22,26 @@ SYNC_INIT_DELAY       = 0.015625            # delay after initianing a sync with
 N_RECV_SYNC           = 10                  # number of allowed parallel received syncs
 N_INIT_SYNC           = 10                  # number of allowed parallel initiated syncs
 
+VERIFY_WORKERS        = 4                   # number of workers verifying signatures of received units off the event loop, 0 verifies on the loop
+VERIFY_CHUNK_SIZE     = 64                  # number of signatures verified by one task of a worker, smaller batches are verified on the loop
+
 TXPU                  = 1                   # number of transactions per unit
 TX_LIMIT              = 1000000             # limit of all txs generated for one process
+TXS_CODEC             = 'zlib'              # codec used to compress transactions in units: 'none', 'zlib', 'bz2' or 'lzma'
+TXS_COMPRESSION_LEVEL = 4                   # compression level passed to the codec of transactions
+TXS_FORMAT            = 'batch'             # encoding of transactions in units: 'batch' (see TxBatch) or 'pickle'
 
 LEVEL_LIMIT           = 20                  # maximal level after which process shuts down
 UNITS_LIMIT           = None                # maximal number of units that are constructed
 SYNCS_LIMIT           = None                # maximal number of syncs that are performed
+PRUNE_DEPTH           = None                # number of levels below the last timing unit that are kept in memory, None disables pruning
+SNAPSHOT_FILE         = None                # prefix of the names of files with poset snapshots (process id is appended), None disables snapshots
+SNAPSHOT_INTERVAL     = 5                   # number of timing units established between consecutive snapshots of the poset
 
 USE_TCOIN             = 1                   # whether to use threshold coin
+COMPRESS_COIN_SHARES  = 1                   # whether to serialize pairing elements in coin shares and threshold coins compressed
 PRECOMPUTE_POPULARITY = 0                   # precompute popularity proof to ease computational load of Poset.compute_vote procedure
+MATRIX_VOTES          = 1                   # whether to compute votes of all prime units at a level at once, using array operations
 ADAPTIVE_DELAY        = 1                   # whether to use the adaptive strategy of determining create_delay
 
 VOTING_LEVEL          = 3                   # level at which the first voting round occurs, this is "t" from the write-up
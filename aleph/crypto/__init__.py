@@ -13,6 +13,6 @@
 
 from .crp import CommonRandomPermutation
 from .byte_utils import xor, sha3_hash, extract_bit
-from .keys import SigningKey, VerifyKey
+from .keys import SigningKey, VerifyKey, verify_signatures, submit_signatures_verification
 from .threshold_coin import ThresholdCoin
 from .threshold_signatures import generate_keys, SecretKey, VerificationKey
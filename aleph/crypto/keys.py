@@ -102,3 +102,44 @@ class VerifyKey:
         '''
 
         return self.verify_key.encode(encoder=nacl.encoding.HexEncoder)
+
+
+def verify_signatures(verify_keys, signatures, messages):
+    '''
+    Verifies a batch of signatures in the calling thread.
+
+    :param list verify_keys: list of VerifyKey objects, the i-th of them is the key of the i-th signature
+    :param list signatures: list of signatures to verify
+    :param list messages: list of messages that were supposedly signed
+    :returns: True if all the signatures are correct, False otherwise
+    '''
+    return all(key.verify_signature(signature, message) for key, signature, message in zip(verify_keys, signatures, messages))
+
+
+def submit_signatures_verification(executor, verify_keys, signatures, messages, chunk_size):
+    '''
+    Splits a batch of signatures into chunks and submits verification of every chunk to the given executor, so that they are verified
+    in parallel. The executor is meant to be a ThreadPoolExecutor, as libsodium does not hold the GIL while verifying.
+
+    :param concurrent.futures.Executor executor: the executor running the verification
+    :param list verify_keys: list of VerifyKey objects, the i-th of them is the key of the i-th signature
+    :param list signatures: list of signatures to verify
+    :param list messages: list of bytes messages that were supposedly signed
+    :param int chunk_size: the number of signatures verified by one task
+    :returns: list of futures, one per chunk, each resolving to True if all the signatures in its chunk are correct, False otherwise
+    '''
+    raw_keys = [bytes(key.verify_key) for key in verify_keys]
+    return [executor.submit(_verify_chunk, raw_keys[i:i+chunk_size], signatures[i:i+chunk_size], messages[i:i+chunk_size])
+            for i in range(0, len(signatures), chunk_size)]
+
+
+def _verify_chunk(raw_keys, signatures, messages):
+    keys = {}
+    for raw_key, signature, message in zip(raw_keys, signatures, messages):
+        if raw_key not in keys:
+            keys[raw_key] = nacl.signing.VerifyKey(raw_key)
+        try:
+            keys[raw_key].verify(message, signature)
+        except nacl.exceptions.BadSignatureError:
+            return False
+    return True
@@ -35,6 +35,8 @@ class ThresholdCoin:
         self.threshold = threshold
         self.secret_key = secret_key
         self.verification_key = verification_key
+        # hashes of nonces, since hashing to the curve is expensive and every nonce (level) is used by many coin shares
+        self.nonce_hashes = {}
 
     def check_validity(self):
         '''
@@ -46,12 +48,23 @@ class ThresholdCoin:
 
         return self.verification_key.verify_share(coin_share, self.process_id, msg_hash)
 
+    def hash_nonce(self, nonce):
+        '''
+        Returns the hash of the nonce (an element of group G1), computing it only once per nonce.
+
+        :param int nonce: nonce to be hashed
+        '''
+        nonce = str(nonce)
+        if nonce not in self.nonce_hashes:
+            self.nonce_hashes[nonce] = self.verification_key.hash_fct(nonce)
+        return self.nonce_hashes[nonce]
+
     def create_coin_share(self, nonce):
         '''
         :param int nonce: nonce for the coin share
         :returns: coin share for the nonce
         '''
-        msg_hash = self.verification_key.hash_fct(str(nonce))
+        msg_hash = self.hash_nonce(nonce)
         coin_share = self.secret_key.generate_share(msg_hash)
 
         return coin_share
@@ -64,10 +77,27 @@ class ThresholdCoin:
         :returns: True if coin_share is valid and False otherwise
         '''
 
-        msg_hash = self.verification_key.hash_fct(str(nonce))
+        msg_hash = self.hash_nonce(nonce)
 
         return self.verification_key.verify_share(coin_share, process_id, msg_hash)
 
+    def verify_coin_shares(self, coin_shares, nonce):
+        '''
+        Verifies a batch of coin shares at once (see VerificationKey.verify_shares). Only if the batch fails, the shares are verified
+        one by one to find the valid ones.
+
+        :param dict coin_shares: keys are identification numbers of processes that generated the coin shares, values are the coin shares
+        :param int nonce: nonce for which the coin shares were generated
+        :returns: dict consisting of the valid coin shares
+        '''
+
+        msg_hash = self.hash_nonce(nonce)
+
+        if self.verification_key.verify_shares(coin_shares, msg_hash):
+            return dict(coin_shares)
+        return {process_id: coin_share for process_id, coin_share in coin_shares.items()
+                if self.verification_key.verify_share(coin_share, process_id, msg_hash)}
+
 
     def combine_coin_shares(self, shares, nonce):
         '''
@@ -88,7 +118,7 @@ class ThresholdCoin:
         coin_value = bytes.fromhex(hex_string)[0] % 2
 
         # verify the result
-        nonce_hash = self.verification_key.hash_fct(nonce)
+        nonce_hash = self.hash_nonce(nonce)
         correctness = self.verification_key.verify_signature(signature, nonce_hash)
 
         return (coin_value, correctness)
@@ -11,7 +11,8 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
 
-from functools import reduce
+from functools import lru_cache, reduce
+import secrets
 
 from charm.toolbox.pairinggroup import ZR, G1, pair
 
@@ -20,6 +21,11 @@ from aleph.config import PAIRING_GROUP, GENERATOR
 # The implementation is based on: Boldyreva, 2002 https://eprint.iacr.org/2002/118.pdf
 # Possible alternative implementation: Shoup, 2000 http://eprint.iacr.org/1999/011
 
+# the number of bits of random exponents in batch verification of shares, a batch with an invalid share passes with probability 2^-64
+BATCH_EXPONENT_BITS = 64
+# combining fewer shares than this is done with separate exponentiations rather than with a multi-exponentiation
+MULTI_EXP_THRESHOLD = 16
+
 
 def generate_keys(n_parties, threshold):
     '''
@@ -103,6 +109,24 @@ class VerificationKey:
         '''
         return pair(share, self.gen) == pair(msg_hash, self.vks[i])
 
+    def verify_shares(self, shares, msg_hash):
+        '''
+        Verifies a batch of shares of a signature of the same message at once, using a randomized linear combination of them:
+        for random exponents r_i it checks whether e(prod share_i^r_i, gen) == e(msg_hash, prod vks[i]^r_i), which costs two pairings
+        instead of two per share. The check fails if any of the shares is invalid, except for probability 2^-BATCH_EXPONENT_BITS.
+
+        :param dict shares: keys are index numbers of parties, values are their shares
+        :param int msg_hash: hash of a message that is signed
+        :returns: True if all the shares are valid, False otherwise
+        '''
+        if len(shares) <= 1:
+            return all(self.verify_share(share, i, msg_hash) for i, share in shares.items())
+
+        exponents = {i: self.group.init(ZR, secrets.randbelow(2**BATCH_EXPONENT_BITS - 1) + 1) for i in shares}
+        combined_share = reduce(lambda x, y: x*y, [share ** exponents[i] for i, share in shares.items()])
+        combined_vk = reduce(lambda x, y: x*y, [self.vks[i] ** exponents[i] for i in shares])
+        return pair(combined_share, self.gen) == pair(msg_hash, combined_vk)
+
     def verify_signature(self, signature, msg_hash):
         '''
         Verifies if signature is valid.
@@ -119,8 +143,10 @@ class VerificationKey:
         :param dict shares: shares of a signature to be produced
         '''
         assert len(shares) == self.threshold
-        R = shares.keys()
-        return reduce(lambda x,y: x*y, [share ** self.lagrange(R, i) for i, share in shares.items()], 1)
+        coefficients = _lagrange_coefficients(frozenset(shares))
+        if len(shares) < MULTI_EXP_THRESHOLD:
+            return reduce(lambda x,y: x*y, [share ** self.group.init(ZR, coefficients[i]) for i, share in shares.items()], 1)
+        return _multi_exp(list(shares.values()), [coefficients[i] for i in shares])
 
     def hash_msg(self, msg):
         '''
@@ -158,3 +184,62 @@ def _poly(coefs, x):
     :param int x: evaluation point
     '''
     return reduce(lambda y, coef: x*y+coef, coefs, 0)
+
+
+@lru_cache(maxsize=64)
+def _lagrange_coefficients(S):
+    '''
+    Computes the Lagrange coefficients for interpolating a polynomial at 0 from its values at points i+1 for i in S, i.e. the same
+    values as VerificationKey.lagrange(S, i) for all i in S at once, as integers modulo the order of the group.
+    The results are cached, as shares are usually combined by the same sets of parties many times.
+
+    :param frozenset S: set of index numbers of parties
+    :returns: dict mapping index numbers of parties to their coefficients
+    '''
+    order = int(PAIRING_GROUP.order())
+    points = [i + 1 for i in S]
+    numerator = reduce(lambda x, y: x*y % order, [-x for x in points], 1)
+    coefficients = {}
+    for i, x_i in zip(S, points):
+        denominator = reduce(lambda x, y: x*y % order, [x_i - x_j for x_j in points if x_j != x_i], -x_i)
+        coefficients[i] = numerator * pow(denominator, -1, order) % order
+    return coefficients
+
+
+def _multi_exp(bases, exponents):
+    '''
+    Computes the product of bases[i] ** exponents[i] using the bucket method of Pippenger: exponents are split into windows of c bits,
+    and for every window the bases are multiplied into buckets indexed by the value of their exponents in this window. This takes
+    about (bits/c) * (len(bases) + 2^(c+1)) group multiplications instead of one exponentiation per base.
+
+    :param list bases: list of group elements
+    :param list exponents: list of nonnegative integers
+    :returns: the product of powers of bases, None if all exponents are 0
+    '''
+    window = max(2, len(bases).bit_length() - 3)
+    mask = (1 << window) - 1
+    n_bits = max(exponent.bit_length() for exponent in exponents)
+
+    result = None
+    for shift in reversed(range(0, n_bits, window)):
+        if result is not None:
+            for _ in range(window):
+                result = result * result
+
+        buckets = [None] * (mask + 1)
+        for base, exponent in zip(bases, exponents):
+            digit = (exponent >> shift) & mask
+            if digit:
+                buckets[digit] = base if buckets[digit] is None else buckets[digit] * base
+
+        # the product of buckets[d] ** d is the product of running products of buckets[mask], ..., buckets[d] over all d
+        running, window_product = None, None
+        for digit in range(mask, 0, -1):
+            if buckets[digit] is not None:
+                running = buckets[digit] if running is None else running * buckets[digit]
+            if running is not None:
+                window_product = running if window_product is None else window_product * running
+
+        if window_product is not None:
+            result = window_product if result is None else result * window_product
+    return result
@@ -17,5 +17,5 @@ Data structures used in the protocol.
 
 from .poset import Poset
 from .userDB import UserDB
-from .unit import Unit, pretty_hash
-from .tx import Tx
+from .unit import Unit, DecodeError, pretty_hash, encode_units, decode_units
+from .tx import Tx, TxBatch
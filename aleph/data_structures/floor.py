@@ -0,0 +1,104 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+'''This module implements floor - the compact representation of the maximal units below a given unit.'''
+
+import numpy as np
+
+
+class Floor:
+    '''
+    This class represents the floor of a unit U, i.e. for every process the list of maximal units created by this process that are below U.
+    For a non-forking process this list has at most one element, hence the floor is kept as a contiguous array of heights together with
+    a list of the corresponding units. Only for processes with more than one maximal unit the full list is stored in a side table.
+
+    :param numpy.ndarray heights: the array whose i-th entry is the maximal height of a unit created by process i below U, or -1
+    :param list tops: the list whose i-th entry is a unit of process i below U of height heights[i], or None
+    :param dict forks: a dictionary {process_id -> list of units} for processes whose units below U do not form a chain
+    :param int forkers: the bitmask of processes for which there is an evidence of forking below U, by default the processes in forks
+    '''
+
+    __slots__ = ['heights', 'tops', 'forks', 'forkers']
+
+    def __init__(self, heights, tops, forks=None, forkers=None):
+        self.heights = heights
+        self.tops = tops
+        self.forks = forks or None
+        self.forkers = forkers if forkers is not None else sum(1 << process_id for process_id in (forks or {}))
+
+
+    @staticmethod
+    def dealing(U, n_processes):
+        '''
+        Creates the floor of a dealing unit U, it contains only U itself.
+
+        :param Unit U: the dealing unit
+        :param int n_processes: the committee size
+        :returns: the floor of U
+        '''
+        heights = np.full(n_processes, -1, dtype=np.int32)
+        heights[U.creator_id] = U.height
+        tops = [None] * n_processes
+        tops[U.creator_id] = U
+        return Floor(heights, tops)
+
+
+    @staticmethod
+    def merge(floors):
+        '''
+        Merges a list of floors by taking the elementwise maximum of heights, together with the corresponding units.
+        The side table of forks is not filled by this method.
+
+        :param list floors: the floors to be merged
+        :returns: a pair (heights, tops) for the merged floor
+        '''
+        all_heights = np.stack([floor.heights for floor in floors])
+        heights = all_heights.max(axis=0)
+        tops = [floors[k].tops[process_id] for process_id, k in enumerate(all_heights.argmax(axis=0).tolist())]
+        return heights, tops
+
+
+    def heights_only(self):
+        '''
+        Returns a copy of this floor that keeps the heights but no references to units. Used for units pruned from the poset.
+        '''
+        return Floor(self.heights, [None] * len(self.tops), forkers=self.forkers)
+
+
+    def is_forked(self, process_id):
+        '''
+        Checks whether there is an evidence of process_id forking in this floor. Note that it is the case if there is more than one maximal
+        unit created by process_id in this floor, but also if the unit having this floor is the one that forks.
+
+        :param int process_id: identification number of a process
+        '''
+        return (self.forkers >> process_id) & 1 == 1
+
+
+    def __getitem__(self, process_id):
+        if self.forks is not None and process_id in self.forks:
+            return self.forks[process_id]
+        top = self.tops[process_id]
+        return [] if top is None else [top]
+
+
+    def __len__(self):
+        return len(self.tops)
+
+
+    def __iter__(self):
+        return (self[process_id] for process_id in range(len(self.tops)))
+
+
+    def __eq__(self, other):
+        return list(self) == list(other)
@@ -13,17 +13,30 @@
 
 '''This module implements poset - the core data structure of Aleph protocol.'''
 
-from itertools import product
 from functools import reduce
 import random
 import logging
+import os
+import pickle
+import zlib
+
+import numpy as np
 
 from aleph.crypto import generate_keys, SecretKey, VerificationKey, ThresholdCoin, sha3_hash, extract_bit
-from aleph.data_structures.unit import Unit
+from aleph.data_structures.unit import Unit, DecodeError
+from aleph.data_structures.floor import Floor
+from aleph.data_structures.unit_table import UnitTable
 
 import aleph.const as consts
 
 
+# the entry of prime_heights_by_level for a process that has no prime unit at the given level
+PRIME_HEIGHT_NONE = np.iinfo(np.int32).max
+
+# the version of the format of poset snapshots
+SNAPSHOT_FORMAT = 'aleph-poset-snapshot-2'
+
+
 class Poset:
     '''
     This class is the core data structure of the Aleph protocol.
@@ -33,10 +46,12 @@ class Poset:
     :param CommonRandomPermutation crp: an object returning the common random permutation of processes at a given level
     :param bool use_tcoin: whether to use threshold coin, mostly so we can disable it for tests
     :param dict compliance_rules: a dictionary describing which compliance_rules to use
+    :param int prune_depth: how many levels below the last timing unit are kept in memory, None disables pruning
+    :param bool matrix_votes: whether to compute votes level by level with array operations instead of recursively unit by unit
     '''
 
     def __init__(self, n_processes, process_id = None, crp = None, use_tcoin = None,
-                compliance_rules = None):
+                compliance_rules = None, prune_depth = None, matrix_votes = None):
         self.n_processes = n_processes
         self.default_compliance_rules = {'forker_muting': True, 'expand_primes': True, 'threshold_coin': use_tcoin}
         self.compliance_rules = compliance_rules
@@ -45,9 +60,15 @@ class Poset:
         self.process_id = process_id
 
         self.units = {}
+        # the basic data of units in the poset, indexed by unit ids -- units are identified by ids in the dictionaries below
+        self.unit_table = UnitTable()
+        # for every process, a dict {height -> list of units} of its units in the poset -- for a nonforking process the lists have one element
+        self.units_by_height = [{} for _ in range(n_processes)]
         self.max_units_per_process = [[] for _ in range(n_processes)]
-        # the list of globally maximal units in the poset -- sorted from the least recent to most recent
-        self.max_units = []
+        # the globally maximal units in the poset -- a dict {Unit -> None} ordered from the least recent to most recent, which allows removing
+        # units in O(1), and the same units divided by level (only levels that contain maximal units and are not pruned are present)
+        self.max_units = {}
+        self.max_units_by_level = {}
         self.forking_height = [float('inf')] * n_processes
 
         #common random permutation
@@ -56,24 +77,51 @@ class Poset:
         self.level_reached = 0
         self.level_timing_established = 0
         # threshold coins dealt, this is a dictionary {Unit_hash -> ThresholdCoin} where keys are hashes of dealing units
+        # a threshold coin is extracted from its dealing unit only when it is needed for the first time (see threshold_coin)
         self.threshold_coins = {}
 
         self.prime_units_by_level = {}
+        # for every level, an array whose i-th entry is the minimal height of a prime unit of process i at this level (or PRIME_HEIGHT_NONE)
+        self.prime_heights_by_level = {}
+        # for every level, the list of prime units at this level in the order they were added -- it indexes rows and columns of vote arrays
+        self.prime_units_as_added_by_level = {}
+        # for every prime unit U (by id) of level L > 0, a boolean array whose i-th entry says whether a prime unit of process i at level L-1
+        # is below U (see get_prime_units_at_level_below_unit), computed once when U is added
+        self.prime_below_masks = {}
+        # for every level L, a boolean matrix whose (i,j)-th entry says whether the j-th prime unit at level L-1 is below the i-th prime unit
+        # at level L, where prime units are indexed as in prime_units_as_added_by_level
+        self.prime_below_matrices = {}
 
         # The list of dealing units for every process -- in a healthy situation (absence of forkers) there should be one per process
         self.dealing_units = [[] for _ in range(n_processes)]
+        # memoized coin tosses: for every level L and every id of a dealing unit, a dict holding the validity of the coin shares of prime
+        # units at level L that were verified ('valid', indexed by unit ids) and the result of combining them ('coin', None if not done yet)
+        self.coin_tosses = {}
 
         #timing units
         self.timing_units = []
 
         #a structure for memoizing partial results about the computation of pi/delta
-        # it has the form of a dict with keys being unit hashes (U_c.hash) and values being dicts indexed by pairs (fun, U.hash)
+        # it has the form of a dict with keys being unit ids (U_c.id) and values being dicts indexed by pairs (fun, U.id)
         # whose value is the memoized value of computing fun(U_c, U) where fun in {pi, delta}
+        # if matrix_votes is set, the dicts are indexed by pairs (fun, level) instead and hold arrays of values for all prime units at level
         self.timing_partial_results = {}
+        # units tracked for popularity proofs (candidates for timing units) -- the i-th of them indexes the i-th row of the arrays below
+        self.popularity_candidates = []
+        self.popularity_index = {}
+        # the (i,j)-th entry is the height of the lowest unit of process j above the i-th candidate, or PRIME_HEIGHT_NONE if there is none
+        self.popularity_heights = np.zeros((0, n_processes), dtype=np.int32)
+        # the (i,j)-th entry is the minimal level of a unit V for which the above unit of process j can be used to prove popularity
+        self.popularity_levels = np.zeros((0, n_processes), dtype=np.int32)
+        self.matrix_votes = matrix_votes if matrix_votes is not None else consts.MATRIX_VOTES
 
         #we maintain a list of units in the poset ordered according to when they were added to the poset -- necessary for dumping the poset to file
         self.units_as_added = []
 
+        self.prune_depth = prune_depth if prune_depth is not None else consts.PRUNE_DEPTH
+        # all levels below this one were removed from prime_units_by_level
+        self.level_pruned = 0
+
 
 #===============================================================================================================================
 # UNITS
@@ -85,14 +133,17 @@ class Poset:
         Sets basic fields of U; should be called prior to check_compliance and add_unit methods.
         This method does the following:
         0. set floor field
-        1. set U's level
+        1. set U's skip pointers
+        2. set U's level
         '''
 
         # 0. set floor field
-        U.floor = [[] for _ in range(self.n_processes)]
         self.update_floor(U)
 
-        # 1. set U's level
+        # 1. set U's skip pointers
+        U.set_skips()
+
+        # 2. set U's level
         U.level = self.level(U)
 
 
@@ -104,7 +155,8 @@ class Poset:
         1. if it is a dealing unit, add it to self.dealing_units
         2. update the lists of maximal elements in the poset.
         3. update forking_height
-        4. if U is prime, add it to prime_units_by_level
+        4. if U is prime, add it to prime_units_by_level and cache its prime ancestors one level below
+        5. update the data for popularity proofs
 
         :param Unit U: unit to be added to the poset
         '''
@@ -114,28 +166,31 @@ class Poset:
 
         self.level_reached = max(self.level_reached, U.level)
         self.units[U.hash()] = U
+        self.unit_table.add(U, self.is_prime(U))
+        self.units_by_height[U.creator_id].setdefault(U.height, []).append(U)
         self.units_as_added.append(U)
+        # units restored from a snapshot are added without prepare_unit
+        if U.skips is None:
+            U.set_skips()
 
-        # 1. if it is a dealing unit, add it to self.dealing_units
+        # 1. if it is a dealing unit, add it to self.dealing_units (the threshold coin in it is extracted lazily, see threshold_coin)
         if not U.parents and not U in self.dealing_units[U.creator_id]:
             self.dealing_units[U.creator_id].append(U)
-            # extract the corresponding tcoin black box (this requires knowing the process_id)
-            if self.use_tcoin:
-                assert self.process_id is not None, "Usage of tcoin enabled but process_id not set."
-                self.extract_tcoin_from_dealing_unit(U)
-
 
         # 2. updates the lists of maximal elements in the poset and forking height
+        # from max_units remove the ones that are U's parents, and add U as a new maximal unit
+        for W in U.parents:
+            if W in self.max_units:
+                self.remove_max_unit(W)
+        self.max_units[U] = None
+        if U.level >= self.level_pruned:
+            self.max_units_by_level.setdefault(U.level, {})[U] = None
+
         if len(U.parents) == 0:
             assert self.max_units_per_process[U.creator_id] == [], "A second dealing unit is attempted to be added to the poset"
             self.max_units_per_process[U.creator_id] = [U]
-            self.max_units.append(U)
         else:
-            # from max_units remove the ones that are U's parents, and add U as a new maximal unit
-            set_U_parents = set(U.parents)
-            self.max_units = [W for W in self.max_units if W not in set_U_parents]
-            self.max_units.append(U)
-
+            # for a nonforking process the below list has exactly one element
             if U.self_predecessor in self.max_units_per_process[U.creator_id]:
                 self.max_units_per_process[U.creator_id].remove(U.self_predecessor)
                 self.max_units_per_process[U.creator_id].append(U)
@@ -144,14 +199,43 @@ class Poset:
                 self.max_units_per_process[U.creator_id].append(U)
                 self.forking_height[U.creator_id] = min(self.forking_height[U.creator_id], U.height)
 
-        # 4. if U is prime, update prime_units_by_level
+        # 4. if U is prime, update prime_units_by_level and prime_heights_by_level
         if self.is_prime(U):
             if U.level not in self.prime_units_by_level:
                 self.prime_units_by_level[U.level] = [[] for _ in range(self.n_processes)]
-            self.prime_units_by_level[U.level][U.creator_id].append(U)
+                self.prime_heights_by_level[U.level] = np.full(self.n_processes, PRIME_HEIGHT_NONE, dtype=np.int32)
+                self.prime_units_as_added_by_level[U.level] = []
+            self.prime_units_as_added_by_level[U.level].append(U)
+            prime_units = self.prime_units_by_level[U.level][U.creator_id]
+            prime_units.append(U)
+            prime_heights = self.prime_heights_by_level[U.level]
+            prime_heights[U.creator_id] = min(prime_heights[U.creator_id], U.height)
             # We need to make sure that there is a deterministic order of units on the self.prime_units_by_level[U.level][U.creator_id] list.
             # In case of forks there can be more than one unit on that list and it is crucial to iterate through them in the same order, by every process.
-            self.prime_units_by_level[U.level][U.creator_id].sort(key = lambda U_x: U_x.hash())
+            if len(prime_units) > 1:
+                prime_units.sort(key = lambda U_x: U_x.hash())
+            if U.level - 1 in self.prime_units_by_level:
+                self.prime_below_masks[U.id] = self.prime_below_mask(U.level - 1, U)
+
+        # 5. update the data for popularity proofs of candidates for timing units
+        if self.popularity_candidates:
+            self.update_popularity(U)
+
+
+    def remove_max_unit(self, U):
+        '''
+        Removes U from the maximal units of the poset, together with the entry of its level in max_units_by_level if U was the last
+        maximal unit of this level.
+
+        :param Unit U: the unit that is no longer maximal
+        '''
+        del self.max_units[U]
+        max_units_at_level = self.max_units_by_level.get(U.level)
+        # maximal units of pruned levels are no longer indexed by level
+        if max_units_at_level is not None:
+            del max_units_at_level[U]
+            if not max_units_at_level:
+                del self.max_units_by_level[U.level]
 
 
     def level(self, U):
@@ -162,30 +246,37 @@ class Poset:
         :returns: the computed level
         '''
 
-        if len(U.parents) == 0:
-            return 0
-
         if U.level is not None:
             return U.level
 
+        if len(U.parents) == 0:
+            return 0
+
         # Let m be the max level of U's parents. The level of U is either m or (m+1)
         m = max([self.level(V) for V in U.parents])
 
         # We need to count all processes that produced a unit V of level m such that V<U
         # We can limit ourselves to prime units V
-        processes_below = 0
-
-        for process_id in range(self.n_processes):
-            Vs = self.prime_units_by_level[m][process_id]
-            for V in Vs:
+        # For a non-forking process there is at most one such V and V<U iff U sees a unit of this process of height >= V.height
+        prime_heights = self.prime_heights_by_level[m]
+        visible = U.floor.heights >= prime_heights
+        # U itself is not yet a prime unit at level m, hence the prime unit of its creator has to be strictly lower
+        visible[U.creator_id] = U.height > prime_heights[U.creator_id]
+        forkers = self.forking_processes()
+        if forkers:
+            visible[forkers] = False
+        processes_below = int(np.count_nonzero(visible))
+
+        # For forking processes we need to check all their prime units one by one
+        for i, process_id in enumerate(forkers):
+            # For efficiency stop if we already have a quorum or cannot reach it
+            if self.is_quorum(processes_below) or not self.is_quorum(processes_below + len(forkers) - i):
+                break
+            for V in self.prime_units_by_level[m][process_id]:
                 if self.below(V, U) and (V is not U):
                     processes_below += 1
                     break
 
-            # For efficiency stop if we cannot reach a quorum
-            if not self.is_quorum(processes_below + self.n_processes - 1 - process_id):
-                break
-
         U.level = m+1 if self.is_quorum(processes_below) else m
         return U.level
 
@@ -196,6 +287,8 @@ class Poset:
 
         :param Unit U: the unit to be checked for being prime
         '''
+        if U.id is not None:
+            return bool(self.unit_table.is_prime[U.id])
         return len(U.parents) == 0 or self.level(U) > self.level(U.self_predecessor)
 
 
@@ -227,12 +320,55 @@ class Poset:
 
     def get_prime_units_at_level_below_unit(self, level, U):
         '''
-        Returns the set of all prime units at a given level that are below the unit U.
+        Returns the set of all prime units at a given level that are below the unit U, in the order of get_all_prime_units_by_level.
+        For prime units U and level = level(U) - 1 the mask of processes is cached when adding U to the poset.
 
         :param int level: the requested level of units
         :param Unit U: the unit below which we want the prime units
         '''
-        return [V for V in self.get_all_prime_units_by_level(level) if self.below(V, U)]
+        if level not in self.prime_units_by_level:
+            return []
+        mask = self.prime_below_masks.get(U.id) if level == U.level - 1 else None
+        if mask is None:
+            mask = self.prime_below_mask(level, U)
+
+        ret = []
+        for process_id, Vs in enumerate(self.prime_units_by_level[level]):
+            if len(Vs) == 1:
+                if mask[process_id]:
+                    ret.append(Vs[0])
+            elif Vs:
+                # process_id forked at this level, and the mask could have been computed before some of its prime units were added
+                ret.extend(V for V in Vs if self.below(V, U))
+        return ret
+
+
+    def prime_below_mask(self, level, U):
+        '''
+        Computes the mask of processes having a prime unit at a given level that is below the unit U.
+        For a process that does not fork, its unique prime unit V at this level is below U iff U sees a unit of this process of height >= V.height.
+
+        :param int level: the requested level of units
+        :param Unit U: the unit below which we want the prime units
+        :returns: a boolean array whose i-th entry says whether a prime unit of process i at the given level is below U
+        '''
+        mask = U.floor.heights >= self.prime_heights_by_level[level]
+        for process_id in self.forking_processes():
+            mask[process_id] = any(self.below(V, U) for V in self.prime_units_by_level[level][process_id])
+        return mask
+
+
+    def units_by_process_in_range(self, process_id, low, high):
+        '''
+        Returns the list of all units created by a given process of heights in the range (low, high], in the order of increasing heights.
+        Units pruned from the poset are not included.
+
+        :param int process_id: identification number of a process
+        :param int low: the height of units just below the range
+        :param int high: the maximal height of units in the range
+        '''
+        units_by_height = self.units_by_height[process_id]
+        return [V for height in range(low + 1, high + 1) for V in units_by_height.get(height, [])]
 
 
     def get_prime_units_by_level_per_process(self, level):
@@ -345,6 +481,14 @@ class Poset:
         if not 'sks' in U.coin_shares or len(U.coin_shares['sks']) != self.n_processes:
             return False
 
+        # the keys are deserialized lazily, only when the threshold coin is used (see threshold_coin), except for the secret key of this
+        # process, without which it could not add coin shares to its units
+        if self.process_id is not None:
+            try:
+                U.coin_shares['sks'][self.process_id]
+            except DecodeError:
+                return False
+
         return True
 
 
@@ -355,8 +499,7 @@ class Poset:
         :param Unit U: the unit whose forking evidence is being checked
         :returns: Boolean value, True if U does not provide evidence of its creator forking
         '''
-        combined_floors = self.combine_floors_per_process(U.parents, U.creator_id)
-        return len(combined_floors) == 1
+        return not self.has_forking_evidence(U, U.creator_id)
 
 
     def check_expand_primes(self, U):
@@ -407,12 +550,8 @@ class Poset:
         if len(U.parents) == 0:
             return True
 
-        parent_processes = set([V.creator_id for V in U.parents])
-        for V, proc in product(U.parents, parent_processes):
-            if self.has_forking_evidence(V, proc):
-                return False
-
-        return True
+        parent_processes = reduce(lambda x, y: x | y, (1 << V.creator_id for V in U.parents))
+        return not any(V.floor.forkers & parent_processes for V in U.parents)
 
 
     def check_parent_correctness(self, U):
@@ -452,15 +591,37 @@ class Poset:
 
     def update_floor(self, U):
         '''
-        Updates floor of the unit U by merging and taking maximums of floors of parents.
+        Sets the floor of the unit U by merging and taking maximums of floors of parents.
+        For processes that are not known to fork this is just the elementwise maximum of the heights in the parents' floors,
+        only for forking processes the maximal units are computed explicitly.
+        The bitmask of known forkers is the union of parents' bitmasks and the processes with more than one maximal unit below U.
 
-        :param Unit U: the unit whose floors are being updated
+        :param Unit U: the unit whose floor is being set
         '''
-        U.floor[U.creator_id] = [U]
-        if U.parents:
-            for process_id in range(self.n_processes):
+        if not U.parents:
+            U.floor = Floor.dealing(U, self.n_processes)
+            return
+
+        heights, tops = Floor.merge([V.floor for V in U.parents])
+        forks = {}
+        forkers = reduce(lambda x, y: x | y, (V.floor.forkers for V in U.parents))
+        for process_id in self.forking_processes():
+            new_floor = self.combine_floors_per_process(U.parents, process_id)
+            if len(new_floor) > 1:
+                forkers |= 1 << process_id
                 if process_id != U.creator_id:
-                    U.floor[process_id] = self.combine_floors_per_process(U.parents, process_id)
+                    forks[process_id] = new_floor
+
+        heights[U.creator_id] = U.height
+        tops[U.creator_id] = U
+        U.floor = Floor(heights, tops, forks, forkers)
+
+
+    def forking_processes(self):
+        '''
+        Returns the list of processes for which a fork is present in the poset.
+        '''
+        return [process_id for process_id, height in enumerate(self.forking_height) if height != float('inf')]
 
 
     def combine_floors_per_process(self, units, process_id):
@@ -507,7 +668,7 @@ class Poset:
         :param int process_id: identification number of process to be verified
         :returns: True if forking evidence is present, False otherwise
         '''
-        return len(U.floor[process_id]) > 1
+        return U.floor.is_forked(process_id)
 
 
 #===============================================================================================================================
@@ -534,12 +695,8 @@ class Poset:
             return True
 
         # at this point we know that this is a forking situation: we need go down the tree from V until we reach U's height
-        # this will not take much time as process_id is banned for forking right after it is detected
-        W = V
-        while W.height > U.height:
-            W = W.self_predecessor
-
-        return (W is U)
+        # skip pointers make this logarithmic in the difference of heights
+        return V.ancestor(U.height) is U
 
 
     def above_within_process(self, U, V):
@@ -561,7 +718,16 @@ class Poset:
         :param Unit U: first unit to be tested
         :param Unit V: second unit to be tested
         '''
-        for W in V.floor[U.creator_id]:
+        process_id = U.creator_id
+        # if U is below the forking height of its creator then every unit of this process of height >= U.height is above U,
+        # hence it is enough to look up the highest unit of this process that V sees
+        if U.height < self.forking_height[process_id] and U.hash() in self.units:
+            if process_id != V.creator_id:
+                return V.floor.heights[process_id] >= U.height
+            # V might not be added to the poset yet, so we cannot rely on its own entry if it is a fork of U
+            return U.height < V.height or U == V
+
+        for W in V.floor[process_id]:
             if self.below_within_process(U, W):
                 return True
         return False
@@ -582,6 +748,69 @@ class Poset:
 #===============================================================================================================================
 
 
+    def track_popularity(self, U_c):
+        '''
+        Starts tracking U_c for popularity proofs. For every process, the lowest unit of this process above U_c is found and from now on
+        it is updated in add_unit. Processes known to fork are not tracked, as their units do not form a chain.
+
+        :param Unit U_c: the unit whose popularity is going to be tested
+        '''
+        if U_c.id in self.popularity_index:
+            return
+        heights = np.full(self.n_processes, PRIME_HEIGHT_NONE, dtype=np.int32)
+        levels = np.full(self.n_processes, PRIME_HEIGHT_NONE, dtype=np.int32)
+        forking_processes = set(self.forking_processes())
+        for process_id, Ws in enumerate(self.max_units_per_process):
+            if process_id in forking_processes:
+                continue
+            W_lowest = None
+            for W in Ws:
+                while W is not None and W.hash() in self.units and self.below(U_c, W):
+                    W_lowest, W = W, W.self_predecessor
+            if W_lowest is not None:
+                heights[process_id], levels[process_id] = W_lowest.height, self._popularity_level(W_lowest)
+
+        self.popularity_index[U_c.id] = len(self.popularity_candidates)
+        self.popularity_candidates.append(U_c)
+        self.popularity_heights = np.vstack([self.popularity_heights, heights])
+        self.popularity_levels = np.vstack([self.popularity_levels, levels])
+
+
+    def untrack_popularity(self, units):
+        '''
+        Stops tracking the given units for popularity proofs.
+
+        :param list units: the units that are not going to be tested for popularity anymore
+        '''
+        ids = set(U.id for U in units)
+        keep = np.array([U_c.id not in ids for U_c in self.popularity_candidates], dtype=bool)
+        self.popularity_candidates = [U_c for U_c, kept in zip(self.popularity_candidates, keep) if kept]
+        self.popularity_index = {U_c.id: i for i, U_c in enumerate(self.popularity_candidates)}
+        self.popularity_heights = self.popularity_heights[keep]
+        self.popularity_levels = self.popularity_levels[keep]
+
+
+    def update_popularity(self, U):
+        '''
+        Records U as the lowest unit of its creator above all the tracked candidates that are below U and were not seen by U.creator_id yet.
+
+        :param Unit U: the unit that was just added to the poset
+        '''
+        process_id = U.creator_id
+        rows = np.flatnonzero(self.popularity_heights[:, process_id] == PRIME_HEIGHT_NONE)
+        if len(rows) == 0:
+            return
+        seen = [self.below(self.popularity_candidates[row], U) for row in rows]
+        rows = rows[seen]
+        self.popularity_heights[rows, process_id] = U.height
+        self.popularity_levels[rows, process_id] = self._popularity_level(U)
+
+
+    def _popularity_level(self, W):
+        # W can be used in a popularity proof by units of level >= level(W) + 2, or level(W) + 1 if W is prime
+        return W.level + 1 if self.is_prime(W) else W.level + 2
+
+
     def proves_popularity(self, V, U_c):
         '''
         Checks whether V proves that U_c is popular on V's level (i.e. everyone sees U on this level).
@@ -589,47 +818,43 @@ class Poset:
         1. W <= V,
         2. W has level <=level(V) - 2, or W is a prime unit at level(V)-1,
         3. U_c <= W.
+        For a process that does not fork it is enough to check the lowest unit W of this process above U_c, as all its units above U_c are
+        above W and have levels not lower than W. These units are maintained in add_unit for all candidates, hence for non-forking processes
+        the proof boils down to comparing arrays against V's floor. The units of forking processes are checked by walking down their chains.
 
         :param Unit V: the "prover" unit
         :param Unit U_c: the unit tested for popularity
         :returns: True or False: does V prove that U_c is popular?
         '''
-        U_c_hash, V_hash = U_c.hash(), V.hash()
-        memo = self.timing_partial_results[U_c_hash]
-        if ('proof', V_hash) in memo:
-            return memo[('proof', V_hash)]
-
         level_V = self.level(V)
         if level_V <= U_c.level or not self.below(U_c, V):
-            memo[('proof', V_hash)] = False
             return False
 
-        # implementation of a simple DFS from V down until we hit units that do not see U
-        seen_units = set([V])
-        seen_processes = set()
-        stack = [V]
-        # the invariants here are that all elements W on stack:
-        #    (1) are also in seen_units
-        #    (2) are above U_c
-        # also, we make sure that no unit is put on stack more than once
-        while stack != [] and not self.is_quorum(len(seen_processes)):
-            W = stack.pop()
-            if W.level <= level_V - 2 or (W.level == level_V - 1 and self.is_prime(W)):
-                # if W is of level >= level_V - 1 and is not prime then it cannot be used for this proof
-                seen_processes.add(W.creator_id)
-            for W_parent in W.parents:
-                if W_parent not in seen_units and self.below(U_c, W_parent):
-                    stack.append(W_parent)
-                    seen_units.add(W_parent)
-
-        memo[('proof', V_hash)] = self.is_quorum(len(seen_processes))
-        return memo[('proof', V_hash)]
+        self.track_popularity(U_c)
+        row = self.popularity_index[U_c.id]
+        proving = (self.popularity_heights[row] <= V.floor.heights) & (self.popularity_levels[row] <= level_V)
+        forking_processes = self.forking_processes()
+        proving[forking_processes] = False
+        n_proving = np.count_nonzero(proving)
+
+        for process_id in forking_processes:
+            if self.is_quorum(n_proving):
+                break
+            for W in V.floor[process_id]:
+                W_lowest = None
+                while W is not None and W.hash() in self.units and self.below(U_c, W):
+                    W_lowest, W = W, W.self_predecessor
+                if W_lowest is not None and self._popularity_level(W_lowest) <= level_V:
+                    n_proving += 1
+                    break
+
+        return self.is_quorum(n_proving)
 
 
     def precompute_popularity_proof(self, V):
         '''
-        Precomputes the popularity proof for V, to avoid computing many popularity proofs at once.
-        Tries to prove the popularity of the first unit in the common random permutation that is below V.
+        Starts tracking the popularity of the first unit in the common random permutation that is below V, at each level for which V
+        can prove popularity, so that the data needed for popularity proofs is computed incrementally when adding units.
 
         :param Unit V: the "prover" unit
         '''
@@ -650,10 +875,7 @@ class Poset:
                 if U_c is not None:
                     break
 
-            if U_c.hash() not in self.timing_partial_results:
-                # set up memoization for this unit
-                self.timing_partial_results[U_c.hash()] = {}
-            self.proves_popularity(V, U_c)
+            self.track_popularity(U_c)
 
 
     def default_vote(self, U, U_c):
@@ -664,7 +886,18 @@ class Poset:
         :param Unit U_c: the unit that is being voted on
         :returns: 1 or 0, as in the fast consensus algorithm
         '''
-        r = U.level - U_c.level - consts.VOTING_LEVEL
+        return self.default_vote_at_level(U.level, U_c)
+
+
+    def default_vote_at_level(self, level, U_c):
+        '''
+        Default vote of units at the given level on popularity of U_c. It depends only on the level and on U_c.
+
+        :param int level: the level of voting units
+        :param Unit U_c: the unit that is being voted on
+        :returns: 1 or 0, as in the fast consensus algorithm
+        '''
+        r = level - U_c.level - consts.VOTING_LEVEL
         assert r >= 1, "Default vote is asked on too low unit level."
 
         if r == 1:
@@ -673,8 +906,8 @@ class Poset:
         if r == 2:
             return 0
 
-        # something which depends upon U_c and U.level only: _simple_coin is good enough
-        return self._simple_coin(U_c, U.level)
+        # something which depends upon U_c and level only: _simple_coin is good enough
+        return self._simple_coin(U_c, level)
 
 
     def compute_vote(self, U, U_c):
@@ -693,9 +926,8 @@ class Poset:
 
         r = U.level - U_c.level - consts.VOTING_LEVEL
         assert r >= 0, "Vote is asked on too low unit level."
-        U_c_hash, U_hash = U_c.hash(), U.hash()
-        memo = self.timing_partial_results[U_c_hash]
-        vote = memo.get(('vote', U_hash), None)
+        memo = self.timing_partial_results[U_c.id]
+        vote = memo.get(('vote', U.id), None)
 
         if vote is not None:
             # this has been already computed and memoized in the past
@@ -714,7 +946,7 @@ class Poset:
                 votes_level_below.append(vote_V)
             vote = self.super_majority(votes_level_below)
 
-        memo[('vote', U_hash)] = vote
+        memo[('vote', U.id)] = vote
         return vote
 
 
@@ -727,11 +959,9 @@ class Poset:
                   or -1 if the decision cannot be inferred yet
         '''
         logger = logging.getLogger(consts.LOGGER_NAME)
-        U_c_hash = U_c.hash()
-
-        if U_c_hash not in self.timing_partial_results:
-            self.timing_partial_results[U_c_hash] = {}
-        memo = self.timing_partial_results[U_c_hash]
+        if U_c.id not in self.timing_partial_results:
+            self.timing_partial_results[U_c.id] = {}
+        memo = self.timing_partial_results[U_c.id]
         if 'decision' in memo.keys():
             return memo['decision']
 
@@ -754,10 +984,13 @@ class Poset:
 
         # Attempt to make a decision using "The fast algorithm"
         for level in range(U_c.level + t + 1, min(U_c.level + t_p_d, self.level_reached + 1)):
-            for U in self.get_all_prime_units_by_level(level):
-                decision = self.compute_vote(U, U_c)
+            if self.matrix_votes:
+                votes = self.compute_votes_at_level(U_c, level).tolist()
+            else:
+                votes = (self.compute_vote(U, U_c) for U in self.get_all_prime_units_by_level(level))
+            for decision in votes:
                 # this is the crucial line: if the (supermajority) vote agrees with the default one -- we have reached consensus
-                if decision == self.default_vote(U, U_c):
+                if decision == self.default_vote_at_level(level, U_c):
                     memo['decision'] = decision
 
                     if decision == 1:
@@ -778,8 +1011,12 @@ class Poset:
             # Note that we always jump by two levels because of the specifics of this consensus protocol.
             # Note that we start at U_c.level + t_p_d + 1 because U_c.level + t_p_d we consider as an "odd" round
             #    and only the next one is the first "even" round where delta is supposed to be computed.
-            for U in self.get_all_prime_units_by_level(level):
-                decision = self.compute_delta(U_c, U)
+            if self.matrix_votes:
+                deltas = dict(zip(self.prime_units_as_added_by_level.get(level, []), self.compute_deltas_at_level(U_c, level).tolist()))
+                decisions = (deltas[U] for U in self.get_all_prime_units_by_level(level))
+            else:
+                decisions = (self.compute_delta(U_c, U) for U in self.get_all_prime_units_by_level(level))
+            for decision in decisions:
                 if decision != -1:
                     memo['decision'] = decision
                     if decision == 1:
@@ -833,9 +1070,11 @@ class Poset:
             if U_t != -1:
                 timing_established.append(U_t)
                 self.timing_units.append(U_t)
+                self.unit_table.is_timing[U_t.id] = True
                 # need to clean up the memoized results about this level
                 for U in self.get_all_prime_units_by_level(level):
-                    self.timing_partial_results.pop(U.hash(), None)
+                    self.timing_partial_results.pop(U.id, None)
+                self.untrack_popularity(self.get_all_prime_units_by_level(level))
             else:
                 # don't need to consider next level if there is already no timing unit chosen for the current level
                 break
@@ -891,35 +1130,32 @@ class Poset:
         # Note that level U_c.level + consts.PI_DELTA_LEVEL has number 1 because we want it to execute an "odd" round
         r = U.level - (U_c.level + consts.PI_DELTA_LEVEL) + 1
         assert r >= 1, "The pi_delta protocol is attempted on a too low of a level."
-        U_c_hash = U_c.hash()
-        U_hash = U.hash()
-        memo = self.timing_partial_results[U_c_hash]
+        memo = self.timing_partial_results[U_c.id]
 
-        pi_value = memo.get(('pi', U_hash), None)
+        pi_value = memo.get(('pi', U.id), None)
         if pi_value is not None:
             return pi_value
 
         votes_level_below = []
 
-        for V in self.get_all_prime_units_by_level(U.level-1):
-            if self.below(V, U):
-                if r == 1:
-                    # we use the votes of the last round of the "fast algorithm"
-                    vote_V = self.compute_vote(V, U_c)
-                    vote = vote_V if vote_V != -1 else self.default_vote(V, U_c)
-                    votes_level_below.append(vote)
-                else:
-                    # we use the pi-values of the last round
-                    votes_level_below.append(self.compute_pi(U_c, V))
+        for V in self.get_prime_units_at_level_below_unit(U.level-1, U):
+            if r == 1:
+                # we use the votes of the last round of the "fast algorithm"
+                vote_V = self.compute_vote(V, U_c)
+                vote = vote_V if vote_V != -1 else self.default_vote(V, U_c)
+                votes_level_below.append(vote)
+            else:
+                # we use the pi-values of the last round
+                votes_level_below.append(self.compute_pi(U_c, V))
 
         if r % 2 == 0:
             # the "exists" round
-            pi_value = self.exists_tc(votes_level_below, U)
+            pi_value = self.exists_tc(votes_level_below, U_c, U)
         elif r % 2 == 1:
             # the "super-majority" round
             pi_value = self.super_majority(votes_level_below)
 
-        memo[('pi', U_hash)] = pi_value
+        memo[('pi', U.id)] = pi_value
         return pi_value
 
 
@@ -931,11 +1167,9 @@ class Poset:
         :param Unit U: the unit that is making the decision
         :returns: 0, 1 or -1, as defined in the whitepaper
         '''
-        U_c_hash = U_c.hash()
-        U_hash = U.hash()
-        memo = self.timing_partial_results[U_c_hash]
+        memo = self.timing_partial_results[U_c.id]
 
-        delta_value = memo.get(('delta', U_hash), None)
+        delta_value = memo.get(('delta', U.id), None)
         if delta_value is not None:
             return delta_value
 
@@ -945,12 +1179,11 @@ class Poset:
         assert r % 2 == 0, "Delta is attempted to be evaluated at an odd level."
 
         pi_values_level_below = []
-        for V in self.get_all_prime_units_by_level(U.level-1):
-            if self.below(V, U):
-                pi_values_level_below.append(self.compute_pi(U_c, V))
+        for V in self.get_prime_units_at_level_below_unit(U.level-1, U):
+            pi_values_level_below.append(self.compute_pi(U_c, V))
 
         delta_value = self.super_majority(pi_values_level_below)
-        memo[('delta', U_hash)] = delta_value
+        memo[('delta', U.id)] = delta_value
         return delta_value
 
 
@@ -989,8 +1222,11 @@ class Poset:
         :returns: True if the coin share is verified successfully, False otherwise
         '''
         U_dealing = self.first_dealing_unit(U)
-        coin_share = U.coin_shares[0]
-        return self.threshold_coins[U_dealing.hash()].verify_coin_share(coin_share, U.creator_id, U.level)
+        try:
+            coin_share = U.coin_shares[0]
+        except DecodeError:
+            return False
+        return U.creator_id in self.verify_coin_shares(U_dealing, {U.creator_id: coin_share}, U.level)
 
 
     def toss_coin(self, U_c, U_tossing):
@@ -1019,41 +1255,67 @@ class Poset:
         U_dealing = None
 
         # run through all prime ancestors of U_tossing to gather coin shares
-        for V in self.get_all_prime_units_by_level(level):
-            # we gathered enough coin shares -- ceil(n_processes/3)
-            if len(coin_shares) == self.coin_share_threshold():
+        # can use only shares from units visible from the tossing unit (so that every process arrives at the same result)
+        # the shares are verified in batches of as many shares as are still missing, usually the first batch is enough
+        candidates = self.get_prime_units_at_level_below_unit(level, U_tossing)
+        while len(coin_shares) < self.coin_share_threshold():
+            batch, batch_units, remaining = {}, {}, []
+            for V in candidates:
+                # we gathered enough coin shares to verify -- ceil(n_processes/3) together with the ones verified already
+                if len(coin_shares) + len(batch) == self.coin_share_threshold():
+                    remaining.append(V)
+                    continue
+
+                # the below check is necessary if V.creator_id is a forker -- we do not want to collect the same share twice
+                if V.creator_id in coin_shares:
+                    continue
+                # another unit of this forker is verified in this batch, V is needed only if its share turns out to be invalid
+                if V.creator_id in batch:
+                    remaining.append(V)
+                    continue
+
+                fdu_V = self.first_dealing_unit(V)
+                if U_dealing is None:
+                    U_dealing = fdu_V
+
+                if U_dealing is not fdu_V:
+                    # two prime ancestors of U_tossing have different fdu's, this might cause a coin toss to fail
+                    # we do not abort yet, hoping that there will be enough coin shares by coin_dealer to toss anyway
+                    continue
+
+                if V.coin_shares != []:
+                    # it is now guaranteed that V.coin_shares = [cs], because this list contains at most one element
+                    # the validity of the share might be known from a coin toss at this level by another unit
+                    valid = self.coin_toss_memo(U_dealing, level)['valid'].get(V.id)
+                    if valid is None:
+                        try:
+                            batch[V.creator_id] = V.coin_shares[0]
+                            batch_units[V.creator_id] = V
+                        except DecodeError:
+                            self.coin_toss_memo(U_dealing, level)['valid'][V.id] = False
+                    elif valid:
+                        coin_shares[V.creator_id] = V.coin_shares[0]
+
+            if not batch:
                 break
-
-            # can use only shares from units visible from the tossing unit (so that every process arrives at the same result)
-            if not self.below(V, U_tossing):
-                continue
-
-            # the below check is necessary if V.creator_id is a forker -- we do not want to collect the same share twice
-            if V.creator_id in coin_shares:
-                continue
-
-            fdu_V = self.first_dealing_unit(V)
-            if U_dealing is None:
-                U_dealing = fdu_V
-
-            if U_dealing is not fdu_V:
-                # two prime ancestors of U_tossing have different fdu's, this might cause a coin toss to fail
-                # we do not abort yet, hoping that there will be enough coin shares by coin_dealer to toss anyway
-                continue
-
-            if V.coin_shares != []:
-                # it is now guaranteed that V.coin_shares = [cs], because this list contains at most one element
-                # check if the share is correct, it might be incorrect even if V.creator_id is not a cheater
-                if self.validate_share(V):
-                    coin_shares[V.creator_id] = V.coin_shares[0]
+            # check if the shares are correct, some might be incorrect even if their creators are not cheaters
+            valid_shares = self.verify_coin_shares(U_dealing, batch, level)
+            for creator_id, V in batch_units.items():
+                self.coin_toss_memo(U_dealing, level)['valid'][V.id] = creator_id in valid_shares
+            coin_shares.update(valid_shares)
+            candidates = remaining
 
 
         # check whether we have enough valid coin shares to toss a coin
         n_collected = len(coin_shares)
         if n_collected == self.coin_share_threshold():
-            # this is the threshold coin we shall use
-            t_coin = self.threshold_coins[U_dealing.hash()]
-            coin, correct = t_coin.combine_coin_shares(coin_shares, str(level))
+            # all valid shares combine to the same signature, hence the result can be reused by every toss with enough valid shares
+            memo = self.coin_toss_memo(U_dealing, level)
+            if memo['coin'] is None:
+                # this is the threshold coin we shall use
+                t_coin = self.threshold_coin(U_dealing)
+                memo['coin'] = t_coin.combine_coin_shares(coin_shares, str(level))
+            coin, correct = memo['coin']
             if correct:
                 logger.info(f'toss_coin_succ {self.process_id} | Succeded - {n_collected} out of required {self.coin_share_threshold()} shares collected')
                 return coin
@@ -1066,6 +1328,19 @@ class Poset:
             return self._simple_coin(U_c, level)
 
 
+    def coin_toss_memo(self, U_dealing, level):
+        '''
+        Returns the memoized results of coin tosses at the given level with the threshold coin dealt in U_dealing (see coin_tosses).
+
+        :param Unit U_dealing: the dealing unit
+        :param int level: the level of coin shares
+        '''
+        memo = self.coin_tosses.setdefault(level, {})
+        if U_dealing.id not in memo:
+            memo[U_dealing.id] = {'valid': {}, 'coin': None}
+        return memo[U_dealing.id]
+
+
     def add_coin_shares(self, U):
         '''
         Adds coin shares to the prime unit U using the simplified strategy: add the coin_share determined by FAI(U, U.level) to U
@@ -1076,12 +1351,58 @@ class Poset:
         coin_shares = []
 
         U_dealing = self.first_dealing_unit(U)
-        coin_shares = [ self.threshold_coins[U_dealing.hash()].create_coin_share(U.level) ]
+        t_coin = self.threshold_coin(U_dealing)
         # The coin_shares are in fact a one-element list, except when something goes wrong with decrypting the tcoin
-        #   in the dealing unit. In the current version it cannot happen, as the tcoins are not encrypted.
+        #   in the dealing unit. In the current version it happens only if the tcoin is malformed, as the tcoins are not encrypted.
+        if t_coin is not None:
+            coin_shares = [ t_coin.create_coin_share(U.level) ]
         U.coin_shares = coin_shares
 
 
+    def threshold_coin(self, U_dealing):
+        '''
+        Returns the threshold coin dealt in a given dealing unit, extracting it from the unit if this was not done yet.
+        Only dealing units chosen by first_dealing_unit get there, hence only the coin material of these units is deserialized.
+
+        :param Unit U_dealing: the dealing unit
+        :returns: the threshold coin, or None if the secret key of this process in U_dealing is malformed
+        '''
+        assert self.process_id is not None, "Usage of tcoin enabled but process_id not set."
+        if U_dealing.hash() not in self.threshold_coins:
+            try:
+                self.extract_tcoin_from_dealing_unit(U_dealing)
+            except DecodeError:
+                self.threshold_coins[U_dealing.hash()] = None
+        return self.threshold_coins[U_dealing.hash()]
+
+
+    def verify_coin_shares(self, U_dealing, shares, level):
+        '''
+        Verifies coin shares at a given level with the threshold coin dealt in U_dealing. Shares that cannot be verified, since
+        the threshold coin or the verification key of their creator is malformed, are treated as invalid.
+
+        :param Unit U_dealing: the dealing unit
+        :param dict shares: keys are ids of creators of the shares, values are the shares
+        :param int level: the level of the shares
+        :returns: the dict of the valid shares
+        '''
+        t_coin = self.threshold_coin(U_dealing)
+        if t_coin is None:
+            return {}
+        try:
+            return t_coin.verify_coin_shares(shares, level)
+        except DecodeError:
+            # verification keys are deserialized lazily, one of them is malformed, so the shares are verified one by one
+            valid_shares = {}
+            for creator_id, share in shares.items():
+                try:
+                    if t_coin.verify_coin_share(share, creator_id, level):
+                        valid_shares[creator_id] = share
+                except DecodeError:
+                    pass
+            return valid_shares
+
+
     def extract_tcoin_from_dealing_unit(self, U):
         '''
         Extracts and stores the threshold coin from a given unit.
@@ -1097,7 +1418,8 @@ class Poset:
     def check_coin_shares(self, U):
         '''
         Checks coin shares of a prime unit that is not a dealing unit.
-        This boils down to checking if U has exactly one share if its level is >= consts.ADD_SHARES and zero shares otherwise.
+        This boils down to checking if U has exactly one share if its level is >= consts.ADD_SHARES and zero shares otherwise, and that
+        the share deserializes to a pairing element.
         At this point there is no point checking whether the share is correct, because that might be because of an dishonest dealer.
 
         :param Unit U: the unit whose shares we are checking
@@ -1107,8 +1429,165 @@ class Poset:
         assert len(U.parents) > 0, "Trying to check shares of a dealing unit."
         if self.level(U) < consts.ADD_SHARES:
             return len(U.coin_shares) == 0
-        else:
-            return len(U.coin_shares) == 1
+        if len(U.coin_shares) != 1:
+            return False
+        # the share of a received unit is deserialized lazily, a malformed one would otherwise fail the coin toss later
+        try:
+            U.coin_shares[0]
+        except DecodeError:
+            return False
+        return True
+
+
+#===============================================================================================================================
+# VOTE MATRICES
+#===============================================================================================================================
+
+
+    def prime_below_matrix(self, level):
+        '''
+        Returns the boolean matrix whose (i,j)-th entry says whether the j-th prime unit at level-1 is below the i-th prime unit at level,
+        where prime units are indexed as in prime_units_as_added_by_level. The matrix is extended with rows for new prime units at level
+        and columns for new prime units at level-1 on demand. A new prime unit at level-1 is never below a prime unit at level that is
+        already in the poset, hence new columns of existing rows are all False.
+
+        :param int level: the level of units indexing the rows of the matrix
+        :returns: the matrix as a numpy array of shape (number of prime units at level, number of prime units at level-1)
+        '''
+        rows = self.prime_units_as_added_by_level.get(level, [])
+        cols = self.prime_units_as_added_by_level.get(level-1, [])
+        matrix = self.prime_below_matrices.get(level, np.zeros((0, 0), dtype=bool))
+        n_rows, n_cols = matrix.shape
+        if n_rows == len(rows) and n_cols == len(cols):
+            return matrix
+
+        if n_cols < len(cols):
+            matrix = np.hstack([matrix, np.zeros((n_rows, len(cols) - n_cols), dtype=bool)])
+        if n_rows < len(rows):
+            new_rows = rows[n_rows:]
+            creators = self.unit_table.creator[[V.id for V in cols]]
+            masks = np.array([self.prime_below_masks[U.id] for U in new_rows], dtype=bool).reshape(len(new_rows), self.n_processes)
+            # for processes with a single prime unit at level-1 the cached masks tell whether it is below
+            new_matrix = masks[:, creators]
+            for j, V in enumerate(cols):
+                if len(self.prime_units_by_level[level-1][V.creator_id]) > 1:
+                    new_matrix[:, j] = [self.below(V, U) for U in new_rows]
+            matrix = np.vstack([matrix, new_matrix])
+
+        self.prime_below_matrices[level] = matrix
+        return matrix
+
+
+    def _values_at_level(self, U_c, name, level, compute):
+        '''
+        Returns the array of values of the function name (vote, pi or delta) on U_c for all prime units at level, indexed as in
+        prime_units_as_added_by_level. Values for prime units added to the poset since the last call are computed using compute.
+
+        :param Unit U_c: the unit which we are deciding about
+        :param str name: the name of the function
+        :param int level: the level of the units
+        :param function compute: a function that takes the list of new prime units at level and the rows of prime_below_matrix(level)
+                                 corresponding to them, and returns the array of values for these units
+        :returns: the array of values, one per prime unit at level
+        '''
+        memo = self.timing_partial_results[U_c.id]
+        values = memo.get((name, level), np.zeros(0, dtype=np.int8))
+        units = self.prime_units_as_added_by_level.get(level, [])
+        if len(values) < len(units):
+            new_units = units[len(values):]
+            below = self.prime_below_matrix(level)[len(values):]
+            values = np.concatenate([values, np.asarray(compute(new_units, below), dtype=np.int8)])
+            memo[(name, level)] = values
+        return values
+
+
+    def _super_majority_rows(self, below, values):
+        '''
+        Computes the supermajority function for every row of the matrix below, on the values of units indexing its columns.
+        '''
+        n_ones = np.count_nonzero(below & (values == 1), axis=1)
+        n_zeros = np.count_nonzero(below & (values == 0), axis=1)
+        return np.where(self.is_quorum(n_ones), 1, np.where(self.is_quorum(n_zeros), 0, -1))
+
+
+    def _votes_with_defaults(self, U_c, level):
+        '''
+        Returns the votes of prime units at level on U_c, with "bot" replaced by the default vote.
+        '''
+        votes = self.compute_votes_at_level(U_c, level)
+        if level - U_c.level - consts.VOTING_LEVEL == 0:
+            # votes at the first level of voting are never "bot"
+            return votes
+        return np.where(votes == -1, self.default_vote_at_level(level, U_c), votes)
+
+
+    def compute_votes_at_level(self, U_c, level):
+        '''
+        Determine the votes of all prime units at level on popularity of U_c, as in compute_vote, but for all units at once.
+
+        :param Unit U_c: the unit that is being voted on
+        :param int level: the level of voting units
+        :returns: the array of votes (0, 1 or -1) indexed as in prime_units_as_added_by_level
+        '''
+        r = level - U_c.level - consts.VOTING_LEVEL
+        assert r >= 0, "Vote is asked on too low unit level."
+
+        def compute(units, below):
+            if r == 0:
+                return [int(self.proves_popularity(U, U_c)) for U in units]
+            votes_level_below = self._votes_with_defaults(U_c, level-1)
+            return self._super_majority_rows(below, votes_level_below)
+
+        return self._values_at_level(U_c, 'votes', level, compute)
+
+
+    def compute_pis_at_level(self, U_c, level):
+        '''
+        Computes the values of the Pi function for all prime units at level, as in compute_pi, but for all units at once.
+
+        :param Unit U_c: the unit which we are deciding about
+        :param int level: the level of units making the decision
+        :returns: the array of values (0, 1 or -1) indexed as in prime_units_as_added_by_level
+        '''
+        r = level - (U_c.level + consts.PI_DELTA_LEVEL) + 1
+        assert r >= 1, "The pi_delta protocol is attempted on a too low of a level."
+
+        def compute(units, below):
+            if r == 1:
+                # we use the votes of the last round of the "fast algorithm"
+                values_level_below = self._votes_with_defaults(U_c, level-1)
+            else:
+                # we use the pi-values of the last round
+                values_level_below = self.compute_pis_at_level(U_c, level-1)
+            if r % 2 == 1:
+                # the "super-majority" round
+                return self._super_majority_rows(below, values_level_below)
+
+            # the "exists" round
+            pi_values = []
+            for i, U in enumerate(units):
+                values = values_level_below[below[i]]
+                pi_values.append(1 if (values == 1).any() else 0 if (values == 0).any() else self.toss_coin(U_c, U))
+            return pi_values
+
+        return self._values_at_level(U_c, 'pis', level, compute)
+
+
+    def compute_deltas_at_level(self, U_c, level):
+        '''
+        Computes the values of the Delta function for all prime units at level, as in compute_delta, but for all units at once.
+
+        :param Unit U_c: the unit which we are deciding about
+        :param int level: the level of units making the decision
+        :returns: the array of values (0, 1 or -1) indexed as in prime_units_as_added_by_level
+        '''
+        r = level - (U_c.level + consts.PI_DELTA_LEVEL) + 1
+        assert r % 2 == 0, "Delta is attempted to be evaluated at an odd level."
+
+        def compute(units, below):
+            return self._super_majority_rows(below, self.compute_pis_at_level(U_c, level-1))
+
+        return self._values_at_level(U_c, 'deltas', level, compute)
 
 
 #===============================================================================================================================
@@ -1130,27 +1609,29 @@ class Poset:
 
         R = sha3_hash(b''.join(sorted(U.hash() for U in units_list)))
 
-        children = {U:[] for U in units_list} #lists of children
-        parents  = {U:0  for U in units_list} #number of parents
+        # units are identified by their ids in the dicts below, as hashing ints is much cheaper than hashing units
+        units = {U.id: U for U in units_list}
+        children = {i:[] for i in units} #lists of children
+        parents  = {i:0  for i in units} #number of parents
         # instead of xor(U.hash(), R) we hash the pair using sha3
-        tiebreaker = {U: sha3_hash(U.hash() + R) for U in units_list}
-        orphans  = set(units_list)
-        for U in units_list:
+        tiebreaker = {i: sha3_hash(U.hash() + R) for i, U in units.items()}
+        orphans  = set(units)
+        for i, U in units.items():
             for P in U.parents:
-                if P in children: #same as "if P in units_list", but faster
-                    children[P].append(U)
-                    parents[U] += 1
-                    orphans.discard(U)
+                if P.id in children: #same as "if P in units_list", but faster
+                    children[P.id].append(i)
+                    parents[i] += 1
+                    orphans.discard(i)
 
         ret = []
 
         while orphans:
-            ret += sorted(orphans, key= lambda x: tiebreaker[x])
+            ret += [units[i] for i in sorted(orphans, key= lambda x: tiebreaker[x])]
 
             out = list(orphans)
             orphans = set()
-            for U in out:
-                for child in children[U]:
+            for i in out:
+                for child in children[i]:
                     parents[child] -= 1
                     if parents[child] == 0:
                         orphans.add(child)
@@ -1161,25 +1642,110 @@ class Poset:
     def timing_round(self, k):
         '''
         Return a list of all units with timing round equal k.
-        In other words, all U such that U < T_k but not U < T_(k-1) where T_i is the i-th timing unit.
+        In other words, all U such that U < T_k but not U < T_(k-1) where T_i is the timing unit at level i.
+        The units are found by traversing the poset down from T_k and stopping at units below T_(k-1), hence the cost is proportional
+        to the size of the round rather than to the size of the poset. Units that were pruned from the poset are assumed to be
+        already ordered and are not traversed.
 
         :param int k: the level of the timing round requested
+        :returns: the list of units with timing round k, in no particular order
         '''
-        T_k = self.timing_units[k]
-        T_k_1 = self.timing_units[k-1] if k > 0 else None
+        # timing units are established for levels 1, 2, 3, ... hence the one of level k is at index (k - 1)
+        T_k = self.timing_units[k-1]
+        T_k_1 = self.timing_units[k-2] if k > 1 else None
 
         ret = []
-        Q = set([T_k])
-        while Q:
-            U = Q.pop()
-            if T_k_1 is None or not self.below(U, T_k_1):
-                ret.append(U)
-                for P in U.parents:
-                    Q.add(P)
+        visited = set([T_k.id])
+        stack = [T_k]
+        while stack:
+            U = stack.pop()
+            if U.hash() not in self.units or (T_k_1 is not None and self.below(U, T_k_1)):
+                continue
+            ret.append(U)
+            for P in U.parents:
+                # units pruned before the poset was restored from a snapshot have no ids, but these are not traversed anyway
+                if P.id is None or P.id not in visited:
+                    visited.add(P.id)
+                    stack.append(P)
 
         return ret
 
 
+#===============================================================================================================================
+# PRUNING
+#===============================================================================================================================
+
+
+    def prune(self):
+        '''
+        Removes from the poset all units of level < L that are below the timing unit at level L, where L = level_timing_established - prune_depth.
+        All these units are already linearly ordered. Dealing units and maximal units are never removed.
+        The removed units are stripped of their data and parents, so that they can be garbage collected as soon as they are not
+        referenced by units that are kept in the poset.
+
+        :returns: the list of units removed from the poset
+        '''
+        if self.prune_depth is None:
+            return []
+        prune_level = self.level_timing_established - self.prune_depth
+        if prune_level <= self.level_pruned:
+            return []
+
+        # timing units are established for levels 1, 2, 3, ... hence the one of level prune_level is at index (prune_level - 1)
+        T = self.timing_units[prune_level - 1]
+        assert T.level == prune_level, "Timing units are not indexed by their levels."
+
+        # go down from T through units that are still in the poset
+        to_prune = []
+        seen_units = set([T])
+        stack = [T]
+        while stack:
+            U = stack.pop()
+            if U.level < prune_level and U.parents and U not in self.max_units_per_process[U.creator_id]:
+                to_prune.append(U)
+            for V in U.parents:
+                if V not in seen_units and V.hash() in self.units:
+                    seen_units.add(V)
+                    stack.append(V)
+
+        for U in to_prune:
+            del self.units[U.hash()]
+            units_at_height = self.units_by_height[U.creator_id][U.height]
+            units_at_height.remove(U)
+            if not units_at_height:
+                del self.units_by_height[U.creator_id][U.height]
+            self.timing_partial_results.pop(U.id, None)
+            self.prime_below_masks.pop(U.id, None)
+        if self.popularity_candidates:
+            self.untrack_popularity(to_prune)
+        self.units_as_added = [U for U in self.units_as_added if U.hash() in self.units]
+
+        for level in range(self.level_pruned, prune_level):
+            self.prime_units_by_level.pop(level, None)
+            self.prime_heights_by_level.pop(level, None)
+            self.prime_units_as_added_by_level.pop(level, None)
+            self.prime_below_matrices.pop(level, None)
+            self.coin_tosses.pop(level, None)
+            self.max_units_by_level.pop(level, None)
+        self.level_pruned = prune_level
+
+        # stripping has to be done at the end, since it removes parents of units
+        for U in to_prune:
+            self.unit_table.remove(U)
+            U.strip()
+
+        return to_prune
+
+
+    def is_outdated(self, U):
+        '''
+        Checks whether all parents of U are of levels that have already been pruned, in which case the level of U cannot be computed.
+
+        :param Unit U: the unit to be checked, its parents have to be present in the poset
+        '''
+        return len(U.parents) > 0 and max(V.level for V in U.parents) < self.level_pruned
+
+
 #===============================================================================================================================
 # DUMPING POSET TO FILE
 #===============================================================================================================================
@@ -1188,11 +1754,11 @@ class Poset:
     def dump_to_file(self, file_name):
         '''
         Dumps the poset to file in a simple format. Units are listed in the same order as the were added to the poset.
+        If the poset was pruned, only the units that are still present in the poset are listed.
         In addition to parents and creator_id we also include info about the level of each unit and a bit 0/1 whether the unit was a timing unit.
 
         :param str file_name: the name of the file in which the poset is to be saved
         '''
-        set_timing_units = set(self.timing_units)
         with open(file_name, 'w') as f:
             f.write("format dump-nofork-level-timing\n")
             f.write(f'process_id {self.process_id}\n')
@@ -1201,6 +1767,139 @@ class Poset:
             for U in self.units_as_added:
                 f.write(f'{U.short_name()} {U.creator_id}\n')
                 f.write('parents '+' '.join(V.short_name() for V in U.parents) + '\n')
-                is_timing = (self.is_prime(U)) and (U in set_timing_units)
+                is_timing = self.unit_table.is_timing[U.id]
                 f.write(f'level {self.level(U)}\n')
                 f.write(f'timing {int(is_timing)}\n')
+
+
+#===============================================================================================================================
+# SNAPSHOTS
+#===============================================================================================================================
+
+
+    def write_snapshot(self, file_name, extra = None):
+        '''
+        Writes a compact binary snapshot of the poset to file, from which the poset can be restored with read_snapshot.
+        Together with units (including signatures and coin shares) the snapshot contains their levels and floors, so that
+        they do not need to be recomputed when the poset is restored. The file is replaced atomically.
+
+        :param str file_name: the name of the file in which the snapshot is to be saved
+        :param dict extra: additional data to be stored together with the poset (e.g. the state of linear ordering)
+        '''
+        units = self.units_as_added
+        unit_hashes = set(self.units)
+        # units pruned from the poset that are still referenced by units in the poset
+        pruned = {}
+        for U in units:
+            referenced = U.parents + U.floor.tops
+            if U.floor.forks:
+                referenced += [V for Vs in U.floor.forks.values() for V in Vs]
+            for V in referenced:
+                if V is not None and V.hash() not in unit_hashes:
+                    pruned[V.hash()] = V
+        for U in self.timing_units:
+            if U.hash() not in unit_hashes:
+                pruned[U.hash()] = U
+
+        forkers = self.forking_processes()
+        def floor_units(U):
+            forks = {process_id: [V.hash() for V in Vs] for process_id, Vs in U.floor.forks.items()} if U.floor.forks else None
+            tops = {process_id: U.floor.tops[process_id].hash() for process_id in forkers if U.floor.tops[process_id] is not None}
+            return forks, tops
+
+        state = {
+            'format': SNAPSHOT_FORMAT,
+            'n_processes': self.n_processes,
+            'process_id': self.process_id,
+            'pruned': [(V.hash(), V.creator_id, V.height, V.level) for V in pruned.values()],
+            'pruned_heights': b''.join(V.floor.heights.tobytes() for V in pruned.values()),
+            'pruned_roots': [V.chain_root.hash() if V.chain_root is not None else None for V in pruned.values()],
+            'units': units,
+            'hashes': [U.hash() for U in units],
+            'levels': [U.level for U in units],
+            'heights': b''.join(U.floor.heights.tobytes() for U in units),
+            'floor_units': [floor_units(U) for U in units] if forkers else None,
+            'max_units_per_process': [[U.hash() for U in Us] for Us in self.max_units_per_process],
+            'forking_height': self.forking_height,
+            'timing_units': [U.hash() for U in self.timing_units],
+            'level_timing_established': self.level_timing_established,
+            'level_pruned': self.level_pruned,
+            'extra': extra,
+        }
+
+        tmp_file_name = file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as f:
+            f.write(zlib.compress(pickle.dumps(state), level=1))
+        os.replace(tmp_file_name, file_name)
+
+
+    def read_snapshot(self, file_name):
+        '''
+        Restores the poset from a snapshot written by write_snapshot. The poset has to be empty.
+        Levels and floors of units are taken from the snapshot instead of being recomputed.
+
+        :param str file_name: the name of the file with the snapshot
+        :returns: the extra data stored together with the poset
+        '''
+        assert not self.units, "Snapshots can be read only into an empty poset."
+        with open(file_name, 'rb') as f:
+            state = pickle.loads(zlib.decompress(f.read()))
+        assert state['format'] == SNAPSHOT_FORMAT, f"Unsupported snapshot format {state['format']}."
+        assert state['n_processes'] == self.n_processes, "The snapshot was written for a different committee size."
+
+        n = self.n_processes
+        units_by_hash = {}
+        # roots of chains of pruned units are dealing units, which are never pruned
+        dealing_units = {U_hash: U for U, U_hash in zip(state['units'], state['hashes']) if not U.parents}
+        pruned_heights = np.frombuffer(state['pruned_heights'], dtype=np.int32).reshape(-1, n)
+        for (U_hash, creator_id, height, level), heights, root in zip(state['pruned'], pruned_heights, state['pruned_roots']):
+            U = Unit(creator_id, [], [])
+            U.hash_value, U.height, U.level = U_hash, height, level
+            U.floor = Floor(heights, [None] * n)
+            U.strip()
+            U.chain_root = dealing_units.get(root)
+            units_by_hash[U_hash] = U
+
+        # the unit of a given process at a given height, for processes that do not fork
+        unit_at_height = {(U.creator_id, U.height): U for U in units_by_hash.values()}
+        all_heights = np.frombuffer(state['heights'], dtype=np.int32).reshape(-1, n)
+        floor_units = state['floor_units'] or [(None, {})] * len(state['units'])
+
+        for U, U_hash, level, heights, (forks, tops) in zip(state['units'], state['hashes'], state['levels'], all_heights, floor_units):
+            U.parents = [units_by_hash[V_hash] for V_hash in U.parents]
+            U.height = U.parents[0].height+1 if U.parents else 0
+            U.hash_value, U.level = U_hash, level
+            units_by_hash[U_hash] = U
+            unit_at_height.setdefault((U.creator_id, U.height), U)
+
+            floor_tops = [unit_at_height[(process_id, height)] if height >= 0 else None for process_id, height in enumerate(heights.tolist())]
+            for process_id, V_hash in tops.items():
+                floor_tops[process_id] = units_by_hash[V_hash]
+            floor_tops[U.creator_id] = U
+            if forks is not None:
+                forks = {process_id: [units_by_hash[V_hash] for V_hash in Vs] for process_id, Vs in forks.items()}
+            U.floor = Floor(heights, floor_tops, forks)
+
+            self.add_unit(U)
+
+        # add_unit does not know about units pruned before the snapshot was written, hence we restore the following fields directly
+        self.max_units_per_process = [[units_by_hash[U_hash] for U_hash in hashes] for hashes in state['max_units_per_process']]
+        max_units = set(U for Us in self.max_units_per_process for U in Us)
+        for U in [U for U in self.max_units if U not in max_units]:
+            self.remove_max_unit(U)
+        self.forking_height = state['forking_height']
+        self.timing_units = [units_by_hash[U_hash] for U_hash in state['timing_units']]
+        for U in self.timing_units:
+            if U.id is not None:
+                self.unit_table.is_timing[U.id] = True
+        self.level_timing_established = state['level_timing_established']
+        self.level_pruned = state['level_pruned']
+        for level in [level for level in self.max_units_by_level if level < self.level_pruned]:
+            del self.max_units_by_level[level]
+        for level in range(self.level_pruned):
+            self.prime_units_by_level.pop(level, None)
+            self.prime_heights_by_level.pop(level, None)
+            self.prime_units_as_added_by_level.pop(level, None)
+            self.prime_below_matrices.pop(level, None)
+
+        return state['extra']
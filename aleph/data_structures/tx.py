@@ -11,6 +11,11 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import struct
+
+import numpy as np
+
+
 class Tx(object):
     '''A class representing a single transaction, that is an act of sending some number of tokens from one user to another.'''
     '''
@@ -54,3 +59,134 @@ class Tx(object):
 
     def __hash__(self):
         return hash(str(self))
+
+
+
+# the header of an encoded batch of transactions: flags, number of accounts, number of transactions and the widths of the columns
+_BATCH_HEADER = struct.Struct('<BIIBB')
+# the flag set when all accounts are hex strings of the same length, which are then stored as raw bytes
+_HEX_ACCOUNTS = 1
+_INDEX_DTYPES = {2: '<u2', 4: '<u4'}
+_AMOUNT_DTYPES = {4: '<u4', 8: '<i8'}
+
+
+class TxBatch(object):
+    '''
+    This class stores a list of transactions in columns: the accounts (public keys) occurring in the transactions are kept once in
+    a table, issuers and receivers are indices into this table, and amounts form an array of integers. Transactions are created
+    only when iterating over the batch.
+
+    :param list accounts: the table of public keys of accounts
+    :param numpy.ndarray issuers: the indices of issuers of transactions in the table of accounts
+    :param numpy.ndarray receivers: the indices of receivers of transactions in the table of accounts
+    :param numpy.ndarray amounts: the amounts of transactions
+    '''
+
+    __slots__ = ['accounts', 'issuers', 'receivers', 'amounts']
+
+    def __init__(self, accounts, issuers, receivers, amounts):
+        self.accounts = accounts
+        self.issuers = issuers
+        self.receivers = receivers
+        self.amounts = amounts
+
+
+    @staticmethod
+    def encodable(txs):
+        '''Checks whether the given transactions can be stored in a batch, i.e. whether they have string keys and integer amounts.'''
+        return all(type(tx) is Tx and isinstance(tx.issuer, str) and isinstance(tx.receiver, str) and type(tx.amount) is int
+                   and -2**63 <= tx.amount < 2**63 for tx in txs)
+
+
+    @classmethod
+    def from_txs(cls, txs):
+        '''
+        Creates a batch containing the given transactions.
+
+        :param list txs: list of transactions, they need to be encodable (see TxBatch.encodable)
+        '''
+        index = {}
+        issuers = [index.setdefault(tx.issuer, len(index)) for tx in txs]
+        receivers = [index.setdefault(tx.receiver, len(index)) for tx in txs]
+        index_dtype = _INDEX_DTYPES[2 if len(index) <= 1<<16 else 4]
+        amounts = [tx.amount for tx in txs]
+        amount_dtype = _AMOUNT_DTYPES[4 if all(0 <= amount < 1<<32 for amount in amounts) else 8]
+        return cls(list(index), np.array(issuers, dtype=index_dtype), np.array(receivers, dtype=index_dtype),
+                   np.array(amounts, dtype=amount_dtype))
+
+
+    def to_bytes(self):
+        '''Returns the bytestring encoding this batch.'''
+        length = len(self.accounts[0]) if self.accounts else 0
+        hex_accounts = all(len(account) == length and _is_hex(account) for account in self.accounts)
+        if hex_accounts:
+            accounts = [struct.pack('<H', length // 2)] + [bytes.fromhex(account) for account in self.accounts]
+        else:
+            accounts = []
+            for account in self.accounts:
+                account = account.encode()
+                accounts += [struct.pack('<H', len(account)), account]
+        header = _BATCH_HEADER.pack(_HEX_ACCOUNTS if hex_accounts else 0, len(self.accounts), len(self.amounts),
+                                    self.issuers.itemsize, self.amounts.itemsize)
+        return b''.join([header] + accounts + [self.issuers.tobytes(), self.receivers.tobytes(), self.amounts.tobytes()])
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        Creates a batch from its encoding. Raises ValueError if the encoding is malformed.
+
+        :param bytes data: the bytestring encoding the batch, as returned by TxBatch.to_bytes
+        '''
+        _check_length(data, _BATCH_HEADER.size)
+        flags, n_accounts, n_txs, index_width, amount_width = _BATCH_HEADER.unpack_from(data, 0)
+        if index_width not in _INDEX_DTYPES or amount_width not in _AMOUNT_DTYPES:
+            raise ValueError('Invalid widths of columns of a batch of transactions.')
+        offset = _BATCH_HEADER.size
+        accounts = []
+        if flags & _HEX_ACCOUNTS:
+            _check_length(data, offset + 2)
+            length, = struct.unpack_from('<H', data, offset)
+            offset += 2
+            _check_length(data, offset + n_accounts * length)
+            for _ in range(n_accounts):
+                accounts.append(bytes(data[offset:offset+length]).hex())
+                offset += length
+        else:
+            for _ in range(n_accounts):
+                _check_length(data, offset + 2)
+                length, = struct.unpack_from('<H', data, offset)
+                _check_length(data, offset + 2 + length)
+                accounts.append(bytes(data[offset+2:offset+2+length]).decode())
+                offset += 2 + length
+        if offset + n_txs * (2 * index_width + amount_width) != len(data):
+            raise ValueError('The columns of a batch of transactions do not match its length.')
+        columns = []
+        for dtype in [_INDEX_DTYPES[index_width], _INDEX_DTYPES[index_width], _AMOUNT_DTYPES[amount_width]]:
+            columns.append(np.frombuffer(data, dtype=dtype, count=n_txs, offset=offset))
+            offset += n_txs * columns[-1].itemsize
+        if n_txs and max(columns[0].max(), columns[1].max()) >= n_accounts:
+            raise ValueError('An index of an account in a batch of transactions is out of range.')
+        return cls(accounts, *columns)
+
+
+    def __iter__(self):
+        accounts = self.accounts
+        for issuer, receiver, amount in zip(self.issuers.tolist(), self.receivers.tolist(), self.amounts.tolist()):
+            yield Tx(accounts[issuer], accounts[receiver], amount)
+
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+def _check_length(data, end):
+    if end > len(data):
+        raise ValueError('The encoding of a batch of transactions is truncated.')
+
+
+def _is_hex(account):
+    try:
+        return len(account) % 2 == 0 and bytes.fromhex(account).hex() == account
+    except ValueError:
+        return False
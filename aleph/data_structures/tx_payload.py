@@ -0,0 +1,157 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+'''This module implements the payload of a unit - the transactions it contains, kept as encoded bytes and decoded only on demand.'''
+
+import bz2
+import io
+import lzma
+import pickle
+import zlib
+
+import aleph.const as consts
+from aleph.data_structures.tx import TxBatch
+
+
+class _ZlibReader(io.RawIOBase):
+    '''A file-like object reading zlib compressed data in chunks, so that only the part being unpickled is decompressed at once.'''
+
+    def __init__(self, data, chunk_size = 1 << 14):
+        self.data = memoryview(data)
+        self.offset = 0
+        self.chunk_size = chunk_size
+        self.decompressor = zlib.decompressobj()
+
+
+    def readable(self):
+        return True
+
+
+    def readinto(self, buffer):
+        while True:
+            chunk = self.decompressor.unconsumed_tail
+            if not chunk:
+                chunk = self.data[self.offset:self.offset + self.chunk_size]
+                self.offset += len(chunk)
+            if not chunk:
+                return 0
+            out = self.decompressor.decompress(chunk, len(buffer))
+            if out:
+                buffer[:len(out)] = out
+                return len(out)
+
+
+# codecs of the payload: name -> (id stored in the first byte of the payload, compress(data, level), reader(data))
+_CODECS = {
+    'none': (0, lambda data, level: data,                                  io.BytesIO),
+    'zlib': (1, lambda data, level: zlib.compress(data, level),            lambda data: io.BufferedReader(_ZlibReader(data))),
+    'bz2':  (2, lambda data, level: bz2.compress(data, level),             lambda data: bz2.BZ2File(io.BytesIO(data))),
+    'lzma': (3, lambda data, level: lzma.compress(data, preset = level),   lambda data: lzma.LZMAFile(io.BytesIO(data))),
+}
+_READERS = {codec_id: reader for codec_id, _, reader in _CODECS.values()}
+# the bit of the first byte of the payload set when transactions are stored as a TxBatch rather than pickled one by one
+_BATCH_FORMAT = 0x10
+_NO_TXS = object()
+
+
+class TxPayload(object):
+    '''
+    This class holds the transactions contained in a unit. A payload created from a list of transactions encodes it only when its bytes
+    are needed for the first time, using the codec and compression level given by consts.TXS_CODEC and consts.TXS_COMPRESSION_LEVEL.
+    A payload created from received bytes keeps these bytes as they are and decodes them only when the transactions are requested,
+    hence relaying a unit never decompresses its transactions.
+    The bytes of a payload consist of the id of the codec followed by the compressed transactions, which are encoded as a TxBatch
+    if consts.TXS_FORMAT is 'batch' and the transactions allow for it, and pickled one by one otherwise.
+
+    :param list txs: list of transactions
+    '''
+
+    __slots__ = ['_txs', '_data', 'n_txs']
+
+    def __init__(self, txs):
+        self._txs = txs
+        self._data = None
+        self.n_txs = len(txs)
+
+
+    @classmethod
+    def from_bytes(cls, data, n_txs):
+        '''
+        Creates a payload from its bytes, without decoding them.
+
+        :param bytes data: the bytes of the payload, as returned by TxPayload.bytes
+        :param int n_txs: the number of transactions encoded in data
+        '''
+        payload = cls.__new__(cls)
+        payload._txs = _NO_TXS
+        payload._data = data
+        payload.n_txs = n_txs
+        return payload
+
+
+    def bytes(self):
+        '''Returns the bytes encoding this payload. They are computed only once, after which the list of transactions is dropped.'''
+        if self._data is None:
+            codec_id, compress, _ = _CODECS[consts.TXS_CODEC]
+            if consts.TXS_FORMAT == 'batch' and TxBatch.encodable(self._txs):
+                codec_id |= _BATCH_FORMAT
+                data = TxBatch.from_txs(self._txs).to_bytes()
+            else:
+                stream = io.BytesIO()
+                pickler = pickle.Pickler(stream)
+                for tx in self._txs:
+                    pickler.dump(tx)
+                data = stream.getvalue()
+            self._data = bytes([codec_id]) + compress(data, consts.TXS_COMPRESSION_LEVEL)
+            self._txs = _NO_TXS
+        return self._data
+
+
+    def __iter__(self):
+        '''
+        Iterates over the transactions in this payload. Pickled transactions are decompressed and unpickled one by one while iterating,
+        without building the list of all of them.
+        '''
+        if self._txs is not _NO_TXS:
+            yield from self._txs
+        elif self._data[0] & _BATCH_FORMAT:
+            yield from self.batch()
+        else:
+            unpickler = pickle.Unpickler(self._reader())
+            for _ in range(self.n_txs):
+                yield unpickler.load()
+
+
+    def batch(self):
+        '''
+        Returns the transactions in this payload as a TxBatch. If they are stored as a batch, only its columns are decoded.
+        '''
+        if self._txs is _NO_TXS and self._data[0] & _BATCH_FORMAT:
+            return TxBatch.from_bytes(self._reader().read())
+        return TxBatch.from_txs(list(self))
+
+
+    def _reader(self):
+        codec_id = self._data[0] & ~_BATCH_FORMAT
+        assert codec_id in _READERS, 'unknown codec of transactions'
+        return _READERS[codec_id](memoryview(self._data)[1:])
+
+
+    def transactions(self):
+        '''Returns the list of transactions contained in this payload.'''
+        return list(self)
+
+
+    def __len__(self):
+        return self.n_txs
@@ -13,11 +13,32 @@
 
 '''This module implements unit - a basic building block of Aleph protocol.'''
 from aleph.crypto import sha3_hash
-import pickle
-import zlib
+import struct
 import base64
 
 from aleph.config import PAIRING_GROUP
+from aleph.data_structures.tx_payload import TxPayload
+import aleph.const as consts
+
+
+# the header of a batch of encoded units: magic bytes, version of the format and the number of units
+UNITS_FORMAT_HEADER = struct.Struct('<3sBI')
+UNITS_FORMAT_MAGIC = b'ALU'
+UNITS_FORMAT_VERSION = 3
+# the bits of the byte describing coin shares in the encoding of a unit
+_SHARES_DEALING = 1
+_SHARES_COMPRESSED = 2
+# a parent given by its hash instead of by a reference to a unit or hash that appeared earlier in the batch
+_PARENT_BY_HASH = -1
+_HASH_LENGTH = 32
+# signatures of units are ed25519 signatures, units that are not signed have empty signatures
+_SIGNATURE_LENGTH = 64
+
+
+class DecodeError(Exception):
+    '''Raised when data received from another process does not encode a valid batch of units.'''
+    pass
+
 
 class Unit(object):
     '''
@@ -31,7 +52,8 @@ class Unit(object):
     '''
 
     __slots__ = ['creator_id', 'parents', 'txs', 'signature', '_coin_shares',
-                 'level', 'floor', 'height', 'hash_value', 'n_txs']
+                 'level', 'floor', 'height', 'hash_value', 'n_txs', 'skips', 'chain_root', 'id',
+                 '_serialized_shares', '_shares_compressed', '_bytestring', '_encoding']
 
     def __init__(self, creator_id, parents, txs, signature=None, coin_shares=None):
         self.creator_id = creator_id
@@ -40,9 +62,20 @@ class Unit(object):
         self._coin_shares = coin_shares or []
         self.level = None
         self.hash_value = None
-        self.txs = zlib.compress(pickle.dumps(txs), level=4)
+        # the serialized coin shares, the bytestring and the encoding of this unit, computed once when needed (see invalidate_encoding)
+        self._serialized_shares = None
+        self._shares_compressed = None
+        self._bytestring = None
+        self._encoding = None
+        # the transactions are encoded only when the bytestring of the unit is computed
+        self.txs = TxPayload(txs)
         self.n_txs = len(txs)
         self.height = parents[0].height+1 if len(parents) > 0 else 0
+        self.skips = None
+        # the unit of height 0 below this unit created by the same process, it is never pruned (see set_skips)
+        self.chain_root = None
+        # the id of this unit in the poset, assigned when it is added to the poset and released when it is pruned
+        self.id = None
 
 
     @property
@@ -50,6 +83,39 @@ class Unit(object):
         return self.parents[0] if len(self.parents) > 0 else None
 
 
+    def set_skips(self):
+        '''
+        Sets the skip pointers of this unit: the k-th of them is the unit of the same creator of height self.height - 2^k below this unit.
+        The pointers are taken from the skip pointers of the self_predecessor, hence these have to be set already.
+        The list ends early if the chain below is cut by pruning. Since dealing units are never pruned, the unit of height 0 in the chain
+        is kept separately as chain_root, so that it can be reached even through pruned units.
+        '''
+        self.skips = []
+        V = self.self_predecessor
+        self.chain_root = V.chain_root if V is not None else self
+        while V is not None:
+            self.skips.append(V)
+            k = len(self.skips) - 1
+            V = V.skips[k] if V.skips is not None and k < len(V.skips) else None
+
+
+    def ancestor(self, height):
+        '''
+        Returns the unit of the same creator of the given height that is below this unit, using skip pointers, i.e. in O(log(self.height)).
+
+        :param int height: the height of the requested unit
+        :returns: the requested unit, or None if height > self.height or the unit cannot be reached since the chain was pruned
+        '''
+        U = self
+        while U is not None and U.height > height:
+            if not U.skips:
+                # U was pruned, only the unit of height 0 of its chain is still known
+                return U.chain_root if height == 0 else None
+            k = min((U.height - height).bit_length() - 1, len(U.skips) - 1)
+            U = U.skips[k]
+        return U if U is not None and U.height == height else None
+
+
     @property
     def coin_shares(self):
         return self._coin_shares
@@ -58,23 +124,91 @@ class Unit(object):
     @coin_shares.setter
     def coin_shares(self, value):
         self._coin_shares = value
+        self.invalidate_encoding()
+
+
+    def invalidate_encoding(self):
+        '''
+        Drops the cached hash, bytestring and encoding of this unit. To be called whenever the contents of the unit are modified.
+        '''
         self.hash_value = None
+        self._serialized_shares = None
+        self._bytestring = None
+        self._encoding = None
 
 
     def transactions(self):
         '''Returns the list of transactions contained in the unit.'''
-        return list(pickle.loads(zlib.decompress(self.txs)))
+        return self.txs.transactions()
+
+
+    def iter_transactions(self):
+        '''Returns an iterator over the transactions contained in the unit, decoding them one by one.'''
+        return iter(self.txs)
+
+
+    def strip(self):
+        '''
+        Drops all the data of this unit except for creator_id, height, level, hash, chain_root and the heights in its floor. In particular
+        all the references to other units except for the never pruned chain_root are removed, so that the units below can be garbage
+        collected.
+        To be used only on units that were pruned from the poset.
+        '''
+        self.hash()
+        self.parents = []
+        self.floor = self.floor.heights_only()
+        self.txs = None
+        self.signature = None
+        self._coin_shares = []
+        self.skips = []
+        self._serialized_shares = None
+        self._bytestring = None
+        self._encoding = None
 
 
     def parents_hashes(self):
         return [V.hash() for V in self.parents] if (self.parents and isinstance(self.parents[0], Unit)) else self.parents
 
 
+    def serialized_coin_shares(self):
+        '''
+        Returns the coin shares of this unit serialized to bytestrings. They are serialized only once, with pairing elements compressed
+        if consts.COMPRESS_COIN_SHARES is set. For received units these are the shares as they were received.
+        '''
+        if self._serialized_shares is None:
+            self._shares_compressed = bool(consts.COMPRESS_COIN_SHARES)
+            self._serialized_shares = _serialize_coin_shares(self.coin_shares, self._shares_compressed)
+        return self._serialized_shares
+
+
     def bytestring(self):
-        '''Create a bytestring with all essential info about this unit for the purpose of signature creation and checking.'''
-        creator = str(self.creator_id).encode()
-        serialized_shares = _serialize_and_flatten_coin_shares(self.coin_shares)
-        return b'|'.join([creator] + self.parents_hashes() + serialized_shares + [self.txs])
+        '''
+        Create a bytestring with all essential info about this unit for the purpose of signature creation and checking.
+        It is computed only once and then reused by hashing, signing and verification.
+        '''
+        if self._bytestring is None:
+            creator = str(self.creator_id).encode()
+            serialized_shares = _flatten_coin_shares(self.serialized_coin_shares())
+            self._bytestring = b'|'.join([creator] + self.parents_hashes() + serialized_shares + [self.txs.bytes()])
+        return self._bytestring
+
+
+    def encoding(self):
+        '''
+        Returns the bytestring encoding this unit without its parents and signature, for the purpose of sending it over the network
+        (see encode_units). It is computed only once, so sending a unit to many processes does not serialize it again.
+        '''
+        if self._encoding is None:
+            parts = [struct.pack('<HI', self.creator_id, self.n_txs), _pack_bytes(self.txs.bytes())]
+            serialized_shares = self.serialized_coin_shares()
+            kind = _SHARES_COMPRESSED if self._shares_compressed else 0
+            if isinstance(serialized_shares, dict):
+                parts += [bytes([kind | _SHARES_DEALING]), _pack_list(serialized_shares['sks']), _pack_list(serialized_shares['vks']),
+                      _pack_bytes(serialized_shares['vk'], '<H')]
+            else:
+                parts += [bytes([kind]), _pack_list(serialized_shares)]
+            self._encoding = b''.join(parts)
+        return self._encoding
 
 
     def short_name(self):
@@ -87,15 +221,28 @@ class Unit(object):
 
 
     def __getstate__(self):
-        serialized_coin_shares = _serialize_coin_shares(self.coin_shares)
-        return (self.creator_id, self.parents_hashes(), self.txs, self.n_txs, self.signature, serialized_coin_shares)
+        serialized_coin_shares = self.serialized_coin_shares()
+        return (self.creator_id, self.parents_hashes(), self.txs.bytes(), self.n_txs, self.signature, serialized_coin_shares, self._shares_compressed)
 
 
     def __setstate__(self, state):
-        self.creator_id, self.parents, self.txs, self.n_txs, self.signature, serialized_coin_shares = state
-        self.coin_shares = _deserialize_coin_shares(serialized_coin_shares)
+        self.creator_id, self.parents, txs, self.n_txs, self.signature, serialized_coin_shares, compressed = state
+        # the transactions are kept as received and decoded only when requested
+        self.txs = TxPayload.from_bytes(txs, self.n_txs)
+        self.coin_shares = _deserialize_coin_shares(serialized_coin_shares, compressed)
+        # the bytestring of the unit has to be computed from the shares as they were received, since the signature was made for them
+        self._serialized_shares = serialized_coin_shares
+        self._shares_compressed = compressed
         self.level = None
         self.hash_value = None
+        self.skips = None
+        self.chain_root = None
+        self.id = None
+
+
+    def __reduce__(self):
+        # units are pickled using their cached encoding, which leaves only parents and signature to be serialized every time
+        return (_decode_unit, (self.encoding(), self.parents_hashes(), self.signature))
 
 
     def hash(self):
@@ -118,7 +265,7 @@ class Unit(object):
         # create a string containing all the essential data in the unit
         str_repr =  str(self.creator_id)
         str_repr += str(self.parents_hashes())
-        str_repr += str(self.txs)
+        str_repr += str(self.txs.bytes())
         str_repr += str(self.coin_shares)
         return str_repr
 
@@ -135,38 +282,235 @@ def pretty_hash(some_hash):
     return '<'+base32_hash[:12]+'>'
 
 
-def _serialize_coin_shares(coin_shares):
+class _LazyElements:
+    '''
+    A list of pairing elements that are deserialized one by one, on first access. Used for coin shares of received units, since most
+    of them (in particular the keys in dealing units whose threshold coins are never used) are never needed.
+    Accessing an element that is malformed raises DecodeError.
+
+    :param list serialized: the list of serialized pairing elements
+    :param bool compressed: whether the elements were serialized compressed
+    '''
+
+    __slots__ = ['serialized', 'compressed', 'elements']
+
+    def __init__(self, serialized, compressed):
+        self.serialized = serialized
+        self.compressed = compressed
+        self.elements = [None] * len(serialized)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if self.elements[index] is None:
+            self.elements[index] = _deserialize_element(self.serialized[index], self.compressed)
+        return self.elements[index]
+
+
+    def __len__(self):
+        return len(self.serialized)
+
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+def _deserialize_element(serialized, compression):
+    try:
+        return PAIRING_GROUP.deserialize(serialized, compression = compression)
+    except Exception as e:
+        # charm raises various exceptions (also generic ones) for bytestrings that do not represent pairing elements
+        raise DecodeError('A pairing element is malformed.') from e
+
+
+def _serialize_elements(elements, compression):
+    if isinstance(elements, _LazyElements) and elements.compressed == compression:
+        return list(elements.serialized)
+    return [PAIRING_GROUP.serialize(element, compression = compression) for element in elements]
+
+
+def _serialize_coin_shares(coin_shares, compression):
     if isinstance(coin_shares, dict):
         # These coin shares come from a dealing units -- represent threshold coins
         serialized_shares = {}
-        serialized_shares['sks'] = [PAIRING_GROUP.serialize(sk, compression = False) for sk in coin_shares['sks']]
-        serialized_shares['vks'] = [PAIRING_GROUP.serialize(vk, compression = False) for vk in coin_shares['vks']]
-        serialized_shares['vk'] = PAIRING_GROUP.serialize(coin_shares['vk'], compression = False)
+        serialized_shares['sks'] = _serialize_elements(coin_shares['sks'], compression)
+        serialized_shares['vks'] = _serialize_elements(coin_shares['vks'], compression)
+        serialized_shares['vk'] = PAIRING_GROUP.serialize(coin_shares['vk'], compression = compression)
         return serialized_shares
     else:
         # These coin shares come from a non-dealing unit -- they just represent regular coin shares
-        return [PAIRING_GROUP.serialize(cs, compression = False) for cs in coin_shares]
+        return _serialize_elements(coin_shares, compression)
 
 
-def _deserialize_coin_shares(serialized_shares):
+def _deserialize_coin_shares(serialized_shares, compressed):
     if isinstance(serialized_shares, dict):
         # These coin shares come from a dealing units -- represent threshold coins
+        # the secret keys and the verification keys of processes are deserialized only when accessed
         coin_shares = {}
-        coin_shares['sks'] = [PAIRING_GROUP.deserialize(sk, compression = False) for sk in serialized_shares['sks']]
-        coin_shares['vks'] = [PAIRING_GROUP.deserialize(vk, compression = False) for vk in serialized_shares['vks']]
-        coin_shares['vk'] = PAIRING_GROUP.deserialize(serialized_shares['vk'], compression = False)
+        coin_shares['sks'] = _LazyElements(serialized_shares['sks'], compressed)
+        coin_shares['vks'] = _LazyElements(serialized_shares['vks'], compressed)
+        coin_shares['vk'] = _deserialize_element(serialized_shares['vk'], compressed)
         return coin_shares
     else:
         # These coin shares come from a non-dealing unit -- they just represent regular coin shares
-        return [PAIRING_GROUP.deserialize(cs, compression = False) for cs in serialized_shares]
+        return _LazyElements(serialized_shares, compressed)
 
 
-def _serialize_and_flatten_coin_shares(coin_shares):
-    '''Return a list of bytestrings as a representation of coin shares.'''
-    if isinstance(coin_shares,dict):
+def _flatten_coin_shares(serialized_shares):
+    '''Return a list of bytestrings as a representation of serialized coin shares.'''
+    if isinstance(serialized_shares, dict):
         # we need to transform a dict of bytestrings into a list of bytestrings
-        serialized_shares = _serialize_coin_shares(coin_shares)
         return serialized_shares['sks'] + serialized_shares['vks'] + [serialized_shares['vk']]
     else:
         # already in the right format
-        return _serialize_coin_shares(coin_shares)
+        return serialized_shares
+
+
+def encode_units(units):
+    '''
+    Encodes a list of units to a bytestring, for the purpose of sending it over the network.
+    Every unit is given by its parents, its signature and its cached encoding (see Unit.encoding). Units in the batch and hashes of
+    parents outside of it are numbered in the order of their appearance, and a parent that has a number is given by it instead of its hash.
+
+    :param list units: the units to be encoded, preferably in a topological order
+    :returns: the bytestring encoding the units
+    '''
+    parts = [UNITS_FORMAT_HEADER.pack(UNITS_FORMAT_MAGIC, UNITS_FORMAT_VERSION, len(units))]
+    # every hash is numbered once, when it appears for the first time (as a parent or as a unit), decode_units numbers them the same way
+    refs = {}
+    for U in units:
+        parents_hashes = U.parents_hashes()
+        parts.append(struct.pack('<H', len(parents_hashes)))
+        for V_hash in parents_hashes:
+            if V_hash in refs:
+                parts.append(struct.pack('<i', refs[V_hash]))
+            else:
+                parts.append(struct.pack('<i', _PARENT_BY_HASH) + V_hash)
+                refs[V_hash] = len(refs)
+        parts.append(_pack_bytes(U.signature or b'', '<H'))
+        parts.append(_pack_bytes(U.encoding()))
+        if U.hash() not in refs:
+            refs[U.hash()] = len(refs)
+    return b''.join(parts)
+
+
+def decode_units(data):
+    '''
+    Decodes a list of units encoded with encode_units. The data is parsed through a memoryview, hence only the fields of units are copied.
+    Parents of the decoded units are given by their hashes, they need to be replaced by units before adding them to the poset.
+
+    :param bytes data: the bytestring encoding the units
+    :returns: the list of units
+    :raises DecodeError: if the data is malformed
+    '''
+    view = memoryview(data)
+    try:
+        magic, version, n_units = UNITS_FORMAT_HEADER.unpack_from(view, 0)
+    except struct.error as e:
+        raise DecodeError('The data is too short to encode units.') from e
+    if magic != UNITS_FORMAT_MAGIC:
+        raise DecodeError('The data does not encode units.')
+    if version != UNITS_FORMAT_VERSION:
+        raise DecodeError(f'Unsupported version {version} of the format of units.')
+    offset = UNITS_FORMAT_HEADER.size
+
+    units = []
+    # hashes of decoded units and of parents, in the order of their numbers (see encode_units)
+    refs, numbered = [], set()
+    try:
+        for _ in range(n_units):
+            n_parents, = struct.unpack_from('<H', view, offset)
+            offset += 2
+            parents = []
+            for _ in range(n_parents):
+                k, = struct.unpack_from('<i', view, offset)
+                offset += 4
+                if k == _PARENT_BY_HASH:
+                    V_hash = bytes(view[offset:offset+_HASH_LENGTH])
+                    offset += _HASH_LENGTH
+                    if len(V_hash) != _HASH_LENGTH or V_hash in numbered:
+                        raise DecodeError('Invalid hash of a parent.')
+                    refs.append(V_hash)
+                    numbered.add(V_hash)
+                elif 0 <= k < len(refs):
+                    V_hash = refs[k]
+                else:
+                    raise DecodeError(f'Invalid reference {k} to a parent.')
+                parents.append(V_hash)
+            signature, offset = _unpack_bytes(view, offset, '<H')
+            if len(signature) not in (0, _SIGNATURE_LENGTH):
+                raise DecodeError(f'Invalid length {len(signature)} of a signature.')
+            encoding, offset = _unpack_bytes(view, offset, copy = False)
+            U = _decode_unit(encoding, parents, signature or None)
+            units.append(U)
+            if U.hash() not in numbered:
+                refs.append(U.hash())
+                numbered.add(U.hash())
+    except (struct.error, IndexError) as e:
+        raise DecodeError('The data encoding units is truncated.') from e
+    if offset != len(view):
+        raise DecodeError('Unexpected data after the encoded units.')
+    return units
+
+
+def _decode_unit(encoding, parents, signature):
+    '''
+    Creates a unit with the given parents and signature from its encoding (see Unit.encoding).
+    Raises DecodeError if the encoding is malformed.
+    '''
+    view = memoryview(encoding)
+    try:
+        creator_id, n_txs = struct.unpack_from('<HI', view, 0)
+        txs, offset = _unpack_bytes(view, 6)
+        kind = view[offset]
+        if kind & _SHARES_DEALING:
+            serialized_shares = {}
+            serialized_shares['sks'], offset = _unpack_list(view, offset + 1)
+            serialized_shares['vks'], offset = _unpack_list(view, offset)
+            serialized_shares['vk'], offset = _unpack_bytes(view, offset, '<H')
+        else:
+            serialized_shares, offset = _unpack_list(view, offset + 1)
+    except (struct.error, IndexError) as e:
+        raise DecodeError('The encoding of a unit is truncated.') from e
+    if offset != len(view) or not txs:
+        raise DecodeError('The encoding of a unit is malformed.')
+
+    U = Unit.__new__(Unit)
+    U.__setstate__((creator_id, parents, txs, n_txs, signature, serialized_shares, bool(kind & _SHARES_COMPRESSED)))
+    # the received encoding can be passed on to other processes as it is
+    U._encoding = bytes(encoding)
+    return U
+
+
+# bytestrings are prefixed by their lengths, which are 4 bytes long for transactions and encodings of units, and 2 bytes long for
+# signatures and serialized coin shares
+def _pack_bytes(data, length_format = '<I'):
+    return struct.pack(length_format, len(data)) + data
+
+
+def _pack_list(items):
+    return struct.pack('<H', len(items)) + b''.join(_pack_bytes(item, '<H') for item in items)
+
+
+def _unpack_bytes(view, offset, length_format = '<I', copy = True):
+    length, = struct.unpack_from(length_format, view, offset)
+    offset += struct.calcsize(length_format)
+    if offset + length > len(view):
+        raise DecodeError('A length prefix exceeds the data.')
+    data = view[offset:offset+length]
+    return (bytes(data) if copy else data), offset + length
+
+
+def _unpack_list(view, offset):
+    length, = struct.unpack_from('<H', view, offset)
+    offset += 2
+    items = []
+    for _ in range(length):
+        item, offset = _unpack_bytes(view, offset, '<H')
+        items.append(item)
+    return items, offset
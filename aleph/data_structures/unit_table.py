@@ -0,0 +1,81 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+'''This module implements unit table - the columnar representation of units in a poset indexed by dense integer ids.'''
+
+import numpy as np
+
+
+class UnitTable:
+    '''
+    This class assigns small integer ids to units added to a poset and keeps some of their data in arrays indexed by these ids:
+    the creator, whether the unit is prime and whether it is a timing unit. The remaining data of units (parents, heights, levels)
+    stays in Unit objects only.
+    Ids of units removed from the poset by pruning are reused, hence the arrays grow only with the maximal number of units kept in
+    the poset at the same time. Therefore all the data about units memoized by the poset in dicts keyed by ids has to be
+    removed when the units are pruned (see Poset.prune), otherwise it would be taken for the data of the unit that gets the id next.
+
+    :param int capacity: the initial number of units for which the arrays are allocated, they grow when needed
+    '''
+
+    def __init__(self, capacity = 1024):
+        self.size = 0
+        self.free = []
+        self.creator = np.zeros(capacity, dtype=np.int32)
+        self.is_prime = np.zeros(capacity, dtype=bool)
+        self.is_timing = np.zeros(capacity, dtype=bool)
+
+
+    def add(self, U, is_prime):
+        '''
+        Adds the unit U to the table and sets its id, reusing an id of a pruned unit if possible.
+
+        :param Unit U: the unit to be added
+        :param bool is_prime: whether U is a prime unit
+        :returns: the id of U
+        '''
+        if self.free:
+            i = self.free.pop()
+        else:
+            i = self.size
+            if i == len(self.creator):
+                self._grow()
+            self.size += 1
+
+        self.creator[i] = U.creator_id
+        self.is_prime[i] = is_prime
+        self.is_timing[i] = False
+        U.id = i
+        return i
+
+
+    def remove(self, U):
+        '''
+        Removes the unit U, which was pruned from the poset, from the table. The id of U is set to None, so that it cannot be confused
+        with the unit that gets this id next.
+
+        :param Unit U: the unit to be removed
+        '''
+        self.free.append(U.id)
+        U.id = None
+
+
+    def _grow(self):
+        capacity = 2 * len(self.creator)
+        for name in ['creator', 'is_prime', 'is_timing']:
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros(capacity - len(column), dtype=column.dtype)]))
+
+
+    def __len__(self):
+        return self.size - len(self.free)
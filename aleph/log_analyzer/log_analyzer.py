@@ -67,6 +67,8 @@ class LogAnalyzer:
 
             'receive_units_done_sync' : self.receive_units_done_parser,
             'receive_units_done_listener' : self.receive_units_done_parser,
+            'dedup_sync' : self.parse_dedup,
+            'dedup_listener' : self.parse_dedup,
 
             'sync_establish_try' : self.parse_try_sync,
             'listener_sync_no' : self.parse_listener_sync_no,
@@ -151,6 +153,7 @@ class LogAnalyzer:
         self.pattern_sync_establish = parse.compile("Established connection to {process_id:d}")
         self.pattern_listener_succ = parse.compile("Syncing with {process_id:d} succesful")
         self.pattern_receive_units_done = parse.compile("Received {n_bytes:d} bytes and {n_units:d} units")
+        self.pattern_dedup = parse.compile("{n_known:d} of {n_units:d} received units were already known, {rest}")
         self.pattern_send_units_sent = parse.compile("Sent {n_units:d} units and {n_bytes:d} bytes to {ex_id:d}")
         self.pattern_try_sync = parse.compile("Establishing connection to {target:d}")
         self.pattern_listener_sync_no = parse.compile("Number of syncs is {n_recv_syncs:d}")
@@ -466,6 +469,13 @@ class LogAnalyzer:
         self.syncs[sync_id]['bytes_received'] = parsed['n_bytes']
 
 
+    def parse_dedup(self, ev_params, msg_body, event):
+        parsed = self.pattern_dedup.parse(msg_body)
+
+        sync_id = int(ev_params[1])
+        self.syncs[sync_id]['units_known'] = parsed['n_known']
+
+
     def parse_send_units_sent(self, ev_params, msg_body, event):
         parsed = self.pattern_send_units_sent.parse(msg_body)
 
@@ -892,6 +902,13 @@ class LogAnalyzer:
                         assert False, "Unsupported decision method."
         return fast, regular, pi_delta
 
+    def get_dedup_ratios(self):
+        '''
+        Returns the (list of) fractions of received units that were already known (in the poset or verified in another sync) per sync.
+        '''
+        return [sync['units_known']/sync['units_received'] for sync in self.syncs.values()
+                if 'units_known' in sync and sync.get('units_received')]
+
     def get_sync_info(self, plot_file = None):
         '''
         Returns statistics regarding synchronizations with other processes. More precisely:
@@ -1347,6 +1364,8 @@ class LogAnalyzer:
 
         - units_recv_sync: the number of units received from the other process in one sync
 
+        - dedup_ratio: the fraction of units received in one sync that were already known, hence not verified again
+
         - time_per_sync: the total duration of the synchronization: start when conn. established,
                          stop when all data exchanged succesfully
 
@@ -1487,6 +1506,7 @@ class LogAnalyzer:
             send_units_not_succeeded, send_requests_not_succeeded, bytes_sent_per_sync = self.get_sync_info(sync_plot_file)
         _append_stat_line(sent_per_sync, 'units_sent_sync')
         _append_stat_line(recv_per_sync, 'units_recv_sync')
+        _append_stat_line(self.get_dedup_ratios(), 'dedup_ratio')
         _append_stat_line(time_per_sync, 'time_per_sync')
         _append_stat_line(time_per_unit_ex, 'time_per_unit_ex')
         _append_stat_line(bytes_per_unit_ex, 'bytes_per_unit_ex')
@@ -12,13 +12,15 @@
 '''
 
 import asyncio
+import concurrent.futures
 import pickle
 import socket
 
 from .channel import Channel, RejectException
 from aleph.utils import timer
 from aleph.actions import poset_info, units_to_send, dehash_parents
-from aleph.data_structures import pretty_hash
+from aleph.data_structures import pretty_hash, encode_units, decode_units, DecodeError
+from aleph.crypto import verify_signatures, submit_signatures_verification
 import aleph.const as consts
 
 
@@ -42,11 +44,31 @@ class Network:
         self.keep_connection = keep_connection
 
         self.n_recv_syncs = 0
+        # the numbers of units received in all syncs and of those that were in the poset or were being verified in another sync
+        self.n_units_received = 0
+        self.n_units_known = 0
+        # hashes and signatures of units verified by ongoing syncs, mapped to futures resolving to the results of verification;
+        # signatures are a part of the key since they are not covered by hashes
+        self.units_in_flight = {}
         self.n_init_syncs = 0
         pid = self.process.process_id
         self.sync_channels = {i: Channel(pid, i, addr) for i, addr in enumerate(addresses) if i != pid}
         self.listen_channels = {i: Channel(pid, i, addr) for i, addr in enumerate(addresses) if i != pid}
 
+        # signatures of received units are verified by these threads, so that syncs and creating units are not stalled meanwhile
+        # (libsodium does not hold the GIL while verifying)
+        self.verify_executor = None
+        if consts.VERIFY_WORKERS:
+            self.verify_executor = concurrent.futures.ThreadPoolExecutor(max_workers=consts.VERIFY_WORKERS)
+
+    def shutdown(self):
+        '''
+        Stops the threads verifying signatures of received units. To be called when the process stops.
+        '''
+        if self.verify_executor is not None:
+            self.verify_executor.shutdown(wait=False)
+            self.verify_executor = None
+
     async def start_server(self, server_started):
         '''
         Start a server that waits for incoming connections and activates corresponding listen_channels
@@ -140,7 +162,7 @@ class Network:
     async def _send_units(self, to_send, channel, mode, ids):
         self.logger.info(f'send_units_start_{mode} {ids} | Sending units to {channel.peer_id}')
         with timer(ids, 'pickle_units'):
-            data = pickle.dumps(to_send)
+            data = encode_units(to_send)
         self.logger.info(
             f'send_units_wait_{mode} {ids} | Sending {len(to_send)} units and {len(data)} bytes to {channel.peer_id}'
         )
@@ -154,16 +176,30 @@ class Network:
         n_bytes = len(data)
         self.logger.info(f'receive_units_bytes_{mode} {ids} | Received {n_bytes} bytes from {channel.peer_id}')
         with timer(ids, 'unpickle_units'):
-            units_received = pickle.loads(data)
+            try:
+                units_received = decode_units(data)
+            except DecodeError as e:
+                self.logger.error(f'receive_units_fail_{mode} {ids} | Malformed units from {channel.peer_id}: {e}')
+                return None
+        if any(not 0 <= U.creator_id < len(self.public_key_list) for U in units_received):
+            self.logger.error(f'receive_units_fail_{mode} {ids} | Units from {channel.peer_id} with invalid creators')
+            return None
         self.logger.info(f'receive_units_done_{mode} {ids} | Received {n_bytes} bytes and {len(units_received)} units')
         return units_received
 
-    def _verify_signatures(self, units_received, mode, ids):
+    async def _verify_signatures(self, units_received, mode, ids):
         self.logger.info(f'verify_sign_{mode} {ids} | Verifying signatures')
 
-        for unit in units_received:
-            if not self.public_key_list[unit.creator_id].verify_signature(unit.signature, unit.bytestring()):
-                return False
+        verify_keys = [self.public_key_list[unit.creator_id] for unit in units_received]
+        signatures = [unit.signature for unit in units_received]
+        messages = [unit.bytestring() for unit in units_received]
+        if self.verify_executor is None or len(units_received) < consts.VERIFY_CHUNK_SIZE:
+            succesful = verify_signatures(verify_keys, signatures, messages)
+        else:
+            futures = submit_signatures_verification(self.verify_executor, verify_keys, signatures, messages, consts.VERIFY_CHUNK_SIZE)
+            succesful = all(await asyncio.gather(*[asyncio.wrap_future(future) for future in futures]))
+        if not succesful:
+            return False
 
         self.logger.info(f'verify_sign_{mode} {ids} | Signatures verified')
         return True
@@ -173,7 +209,11 @@ class Network:
         printable_unit_hashes = ''
 
         for unit in units_received:
-            dehash_parents(self.process.poset, unit)
+            if unit.hash() in self.process.poset.units:
+                continue
+            if not dehash_parents(self.process.poset, unit):
+                self.logger.error(f'add_received_fail_{mode} {ids} | unit {unit.short_name()} from {peer_id} has unknown parents')
+                return False
             printable_unit_hashes += (' ' + unit.short_name())
             if not self.process.add_unit_to_poset(unit):
                 self.logger.error(f'add_received_fail_{mode} {ids} | unit {unit.short_name()} from {peer_id} was rejected')
@@ -184,15 +224,58 @@ class Network:
         )
         return True
 
-    def _verify_signatures_and_add_units(self, units_received, peer_id, mode, ids):
-        with timer(ids, 'verify_signatures'):
-            succesful = self._verify_signatures(units_received, mode, ids)
-        if not succesful:
-            self.logger.error(f'{mode}_invalid_sign {ids} | Got a unit from {peer_id} with invalid signature; aborting')
+    def _dedup_units(self, units_received, mode, ids):
+        '''
+        Splits the received units into units never seen before and units whose signatures are being verified in another sync,
+        skipping the units that are already in the poset.
+        :returns: the list of new units and the dictionary mapping hashes of units verified elsewhere to futures with the results
+        '''
+        new_units, in_flight = [], {}
+        for unit in units_received:
+            unit_hash = unit.hash()
+            if unit_hash in self.process.poset.units:
+                continue
+            if (unit_hash, unit.signature) in self.units_in_flight:
+                in_flight[unit_hash] = self.units_in_flight[(unit_hash, unit.signature)]
+            else:
+                new_units.append(unit)
+
+        n_known = len(units_received) - len(new_units)
+        self.n_units_received += len(units_received)
+        self.n_units_known += n_known
+        ratio = self.n_units_known / self.n_units_received if self.n_units_received else 0
+        self.logger.info(f'dedup_{mode} {ids} | {n_known} of {len(units_received)} received units were already known, '
+                         f'{len(in_flight)} of them verified in other syncs; dedup ratio so far {ratio:.3f}')
+        return new_units, in_flight
+
+    async def _verify_signatures_and_add_units(self, units_received, peer_id, mode, ids):
+        if units_received is None:
+            self.logger.error(f'{mode}_malformed {ids} | Got malformed units from {peer_id}; aborting')
             return False
+        new_units, in_flight = self._dedup_units(units_received, mode, ids)
+        verified = asyncio.get_event_loop().create_future()
+        for unit in new_units:
+            self.units_in_flight[(unit.hash(), unit.signature)] = verified
+        try:
+            with timer(ids, 'verify_signatures'):
+                succesful = await self._verify_signatures(new_units, mode, ids)
+                verified.set_result(succesful)
+                if succesful and not all(await asyncio.gather(*set(in_flight.values()))):
+                    # some other sync failed to verify its units, check the ones we need ourselves
+                    retry = [unit for unit in units_received if unit.hash() in in_flight and unit.hash() not in self.process.poset.units]
+                    succesful = await self._verify_signatures(retry, mode, ids)
+            if not succesful:
+                self.logger.error(f'{mode}_invalid_sign {ids} | Got a unit from {peer_id} with invalid signature; aborting')
+                return False
 
-        with timer(ids, 'add_units'):
-            succesful = self._add_units(units_received, peer_id, mode, ids)
+            with timer(ids, 'add_units'):
+                succesful = self._add_units(units_received, peer_id, mode, ids)
+        finally:
+            if not verified.done():
+                verified.set_result(False)
+            for unit in new_units:
+                if self.units_in_flight.get((unit.hash(), unit.signature)) is verified:
+                    del self.units_in_flight[(unit.hash(), unit.signature)]
         if not succesful:
             self.logger.error(
                 f'{mode}_not_compliant {ids} | Got unit from {peer_id} that does not comply to the rules; aborting'
@@ -246,18 +329,20 @@ class Network:
             with timer(ids, 'prepare_units'):
                 to_send, to_request = units_to_send(self.process.poset, their_poset_info, their_requests)
             await self._send_units(to_send, channel, 'sync', ids)
-            received_hashes = [U.hash() for U in units_received]
+            received_hashes = [U.hash() for U in units_received or []]
             to_request = [[r for r in reqs if r not in received_hashes] for reqs in to_request]
             await self._send_requests(to_request, channel, 'sync', ids)
 
             # step 4 (only if we requested something)
             if any(to_request):
                 self.logger.info(f'sync_extended {ids} | Sync with {peer_id} extended due to forks')
-                units_received = await self._receive_units(channel, 'sync', ids)
+                more_units = await self._receive_units(channel, 'sync', ids)
+                # the sync is rejected if any of the received batches is malformed
+                units_received = more_units if units_received is not None else None
 
         await self.maybe_close(channel)
 
-        if self._verify_signatures_and_add_units(units_received, peer_id, 'sync', ids):
+        if await self._verify_signatures_and_add_units(units_received, peer_id, 'sync', ids):
             self.logger.info(f'sync_succ {ids} | Syncing with {peer_id} successful')
             timer.write_summary(where=self.logger, groups=[ids])
         else:
@@ -304,7 +389,7 @@ class Network:
                     to_send, _ = units_to_send(self.process.poset, their_poset_info, their_requests)
                 await self._send_units(to_send, channel, 'listener', ids)
 
-            if self._verify_signatures_and_add_units(units_received, peer_id, 'listener', ids):
+            if await self._verify_signatures_and_add_units(units_received, peer_id, 'listener', ids):
                 self.logger.info(f'listener_succ {ids} | Syncing with {peer_id} successful')
                 timer.write_summary(where=self.logger, groups=[ids])
             else:
@@ -78,15 +78,22 @@ class Process:
         self.keep_syncing = True
         self.tx_source = tx_source
 
-        # units that have not yet been linearly ordered
-        self.unordered_units = []
-
         # hashes of units in linear order
         self.linear_order = []
 
+        # number of hashes removed from the front of linear_order after the units ordered by them were pruned from the poset
+        self.linear_order_pruned = 0
+
+        # level -> position in the (unpruned) linear order right after the last unit of the timing round at this level
+        self.timing_round_ends = {}
+
         # list of units (from least recent to most recent) created by out process
         self.our_units = []
 
+        # the file in which snapshots of the poset are saved and the number of timing units established since the last snapshot
+        self.snapshot_file = f'{consts.SNAPSHOT_FILE}_{self.process_id}' if consts.SNAPSHOT_FILE is not None else None
+        self.timing_units_since_snapshot = 0
+
         # we number all the syncs performed by process with unique ids (both outcoming and incoming)
         self.sync_id = 0
 
@@ -96,6 +103,9 @@ class Process:
         # initialize logger
         self.logger = logging.getLogger(consts.LOGGER_NAME)
 
+        if self.snapshot_file is not None and os.path.exists(self.snapshot_file):
+            self.restore_from_snapshot()
+
         #initialize network
         self.network = Network(self, addresses, public_key_list, self.logger)
 
@@ -128,7 +138,6 @@ class Process:
         #NOTE: it is assumed at this point that U is not yet in the poset
         assert U.hash() not in self.poset.units, "A duplicate unit is being added to the poset."
         self.poset.add_unit(U)
-        self.unordered_units.append(U)
         if self.poset.is_prime(U):
 
             with timer(self.process_id, 'attempt_timing'):
@@ -144,17 +153,10 @@ class Process:
                 self.logger.info(f'timing_new {self.process_id} | Timing unit at level {U_timing.level} established.')
             for U_timing in new_timing_units:
                 with timer(self.process_id, f'linear_order_{U_timing.level}'):
-                    units_to_order = []
-                    updated_unordered_units = []
-                    for V in self.unordered_units:
-                        if self.poset.below(V, U_timing):
-                            units_to_order.append(V)
-                        else:
-                            updated_unordered_units.append(V)
-
+                    units_to_order = self.poset.timing_round(U_timing.level)
                     ordered_units = self.poset.break_ties(units_to_order)
                     self.linear_order += [W.hash() for W in ordered_units]
-                    self.unordered_units = updated_unordered_units
+                    self.timing_round_ends[U_timing.level] = self.linear_order_pruned + len(self.linear_order)
 
                     printable_unit_hashes = ' '.join(W.short_name() for W in ordered_units)
                     n_txs = self.process_txs_in_unit_list(ordered_units)
@@ -163,6 +165,65 @@ class Process:
                 timer.write_summary(where=self.logger, groups=[self.process_id])
                 timer.reset(self.process_id)
 
+            if new_timing_units:
+                self.prune_poset()
+                self.timing_units_since_snapshot += len(new_timing_units)
+                if self.snapshot_file is not None and self.timing_units_since_snapshot >= consts.SNAPSHOT_INTERVAL:
+                    self.write_snapshot()
+
+
+    def prune_poset(self):
+        '''
+        Prunes the poset (if enabled in the poset) and forgets about the pruned units also in the process.
+        '''
+        with timer(self.process_id, 'prune'):
+            pruned_units = self.poset.prune()
+            if not pruned_units:
+                return
+            # timing rounds below the pruned level form a prefix of the linear order, hence it is enough to cut it off
+            pruned_levels = [level for level in self.timing_round_ends if level < self.poset.level_pruned]
+            if pruned_levels:
+                end = max(self.timing_round_ends.pop(level) for level in pruned_levels)
+                del self.linear_order[:end - self.linear_order_pruned]
+                self.linear_order_pruned = end
+            pruned_hashes = set(U.hash() for U in pruned_units)
+            self.our_units = [U for U in self.our_units if U.hash() not in pruned_hashes]
+
+        self.logger.info(f'prune {self.process_id} | Pruned {len(pruned_units)} units below level {self.poset.level_pruned}, '
+                         f'{len(self.poset.units)} units left in the poset')
+        timer.write_summary(where=self.logger, groups=[self.process_id])
+        timer.reset(self.process_id)
+
+
+    def write_snapshot(self):
+        '''
+        Saves a snapshot of the poset together with the linear order to self.snapshot_file.
+        '''
+        with timer(self.process_id, 'snapshot'):
+            extra = {'linear_order': self.linear_order, 'linear_order_pruned': self.linear_order_pruned,
+                     'timing_round_ends': self.timing_round_ends}
+            self.poset.write_snapshot(self.snapshot_file, extra)
+            self.timing_units_since_snapshot = 0
+
+        self.logger.info(f'snapshot {self.process_id} | Saved {len(self.poset.units)} units at level {self.poset.level_reached} to {self.snapshot_file}')
+        timer.write_summary(where=self.logger, groups=[self.process_id])
+        timer.reset(self.process_id)
+
+
+    def restore_from_snapshot(self):
+        '''
+        Restores the poset and the linear order from self.snapshot_file, so that a restarted process does not need to sync the whole poset.
+        '''
+        with timer(self.process_id, 'restore'):
+            extra = self.poset.read_snapshot(self.snapshot_file)
+            self.linear_order, self.linear_order_pruned = extra['linear_order'], extra['linear_order_pruned']
+            self.timing_round_ends = extra['timing_round_ends']
+            self.our_units = [U for U in self.poset.units_as_added if U.creator_id == self.process_id]
+
+        self.logger.info(f'restore {self.process_id} | Restored {len(self.poset.units)} units at level {self.poset.level_reached} from {self.snapshot_file}')
+        timer.write_summary(where=self.logger, groups=[self.process_id])
+        timer.reset(self.process_id)
+
 
     def add_unit_to_poset(self, U):
         '''
@@ -174,6 +235,10 @@ class Process:
         if U.hash() in self.poset.units.keys():
             return True
 
+        if self.poset.is_outdated(U):
+            self.logger.info(f'add_outdated {self.process_id} | Unit {U.short_name()} is above pruned levels only, cannot be added')
+            return False
+
         self.poset.prepare_unit(U)
         if self.poset.check_compliance(U):
             old_level = self.poset.level_reached
@@ -362,5 +427,6 @@ class Process:
             listener_task.cancel()
         finally:
             p.kill()
+            self.network.shutdown()
 
         self.logger.info(f'process_done {self.process_id} | Exiting program')
@@ -13,8 +13,9 @@
 
 import random
 import string
+from concurrent.futures import ThreadPoolExecutor
 
-from aleph.crypto import SigningKey, VerifyKey
+from aleph.crypto import SigningKey, VerifyKey, verify_signatures, submit_signatures_verification
 
 def test_true():
     '''
@@ -47,3 +48,23 @@ def test_false():
         k = random.randint(0, n-1)
         msg = msg[:k] + msg[k+1:]
         assert not vk.verify_signature(sign, msg)
+
+
+def test_batch():
+    '''
+    Test whether a batch of signatures made with different keys is accepted, both sequentially and in chunks verified by a thread pool,
+    and whether it is rejected after changing one of the messages.
+    '''
+    sks = [SigningKey() for _ in range(4)]
+    vks = [VerifyKey.from_SigningKey(sk) for sk in sks]
+    keys = random.choices(range(4), k=100)
+    msgs = [''.join(random.choices(string.printable, k=100)).encode() for _ in keys]
+    signs = [sks[i].sign(msg) for i, msg in zip(keys, msgs)]
+    verify_keys = [vks[i] for i in keys]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert verify_signatures(verify_keys, signs, msgs)
+        assert all(f.result() for f in submit_signatures_verification(executor, verify_keys, signs, msgs, 16))
+        msgs[57] = msgs[57][1:]
+        assert not verify_signatures(verify_keys, signs, msgs)
+        assert not all(f.result() for f in submit_signatures_verification(executor, verify_keys, signs, msgs, 16))
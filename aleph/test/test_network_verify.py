@@ -0,0 +1,135 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from aleph.crypto import SigningKey, VerifyKey
+from aleph.data_structures import Poset, encode_units, decode_units
+from aleph.network import Network
+from aleph.utils import dag_utils
+import aleph.const as consts
+
+
+def prepare_network(n_processes, n_units):
+    '''
+    Creates a network of a process with an empty poset, and a batch of signed units created by the other processes, encoded as if
+    received from the network.
+    :returns: the network and the encoded units
+    '''
+    dag = dag_utils.generate_random_nonforking(n_processes, n_units)
+    source, _ = dag_utils.poset_from_dag(dag)
+    sks = [SigningKey() for _ in range(n_processes)]
+    for U in source.units_as_added:
+        U.signature = sks[U.creator_id].sign(U.bytestring())
+
+    poset = Poset(n_processes = n_processes, use_tcoin = False)
+    def add_unit_to_poset(U):
+        poset.prepare_unit(U)
+        poset.add_unit(U)
+        return True
+    process = SimpleNamespace(process_id = 0, poset = poset, add_unit_to_poset = add_unit_to_poset)
+    addresses = [('127.0.0.1', 9000 + i) for i in range(n_processes)]
+    public_key_list = [VerifyKey.from_SigningKey(sk) for sk in sks]
+    network = Network(process, addresses, public_key_list, logging.getLogger(consts.LOGGER_NAME))
+    return network, encode_units(source.units_as_added)
+
+
+def count_verifications(network, fail_first):
+    '''
+    Replaces _verify_signatures of the network by a version that records the verified units and yields to the event loop before
+    verifying them, so that concurrent syncs interleave. If fail_first is set, the first verification fails regardless of signatures.
+    :returns: the list to which lists of hashes of verified units are appended
+    '''
+    verified = []
+    verify_signatures = network._verify_signatures
+    async def _verify_signatures(units_received, mode, ids):
+        verified.append([U.hash() for U in units_received])
+        first = len(verified) == 1
+        await asyncio.sleep(0)
+        if fail_first and first:
+            return False
+        return await verify_signatures(units_received, mode, ids)
+    network._verify_signatures = _verify_signatures
+    return verified
+
+
+def test_overlapping_receives():
+    '''
+    Two syncs receive the same units at the same time: the units are verified only by the sync that received them first, and the
+    other one waits for the result instead of verifying them again.
+    '''
+    network, data = prepare_network(4, 40)
+    verified = count_verifications(network, fail_first = False)
+
+    async def receive_twice():
+        return await asyncio.wait_for(asyncio.gather(
+            network._verify_signatures_and_add_units(decode_units(data), 1, 'sync', 'first'),
+            network._verify_signatures_and_add_units(decode_units(data), 2, 'listener', 'second'),
+        ), timeout = 10)
+
+    assert asyncio.run(receive_twice()) == [True, True]
+    n_units = len(decode_units(data))
+    assert len(network.process.poset.units) == n_units
+    assert sorted(map(len, verified)) == [0, n_units]
+    assert network.units_in_flight == {}
+
+
+def test_overlapping_receives_failed_verification():
+    '''
+    Two syncs receive the same units at the same time and the verification in the first one fails: the second sync has to verify
+    the units on its own, and the units verified by the first sync are no longer registered as being in flight.
+    '''
+    network, data = prepare_network(4, 40)
+    verified = count_verifications(network, fail_first = True)
+
+    async def receive_twice():
+        return await asyncio.wait_for(asyncio.gather(
+            network._verify_signatures_and_add_units(decode_units(data), 1, 'sync', 'first'),
+            network._verify_signatures_and_add_units(decode_units(data), 2, 'listener', 'second'),
+        ), timeout = 10)
+
+    assert asyncio.run(receive_twice()) == [False, True]
+    n_units = len(decode_units(data))
+    assert len(network.process.poset.units) == n_units
+    # the first sync verifies all units, the second one none of them, and then retries all of them after the first sync failed
+    assert [len(hashes) for hashes in verified] == [n_units, 0, n_units]
+    assert sorted(verified[0]) == sorted(verified[2])
+    assert network.units_in_flight == {}
+
+
+def test_verify_signatures_in_chunks(monkeypatch):
+    '''
+    Test whether signatures of a batch of received units are verified in chunks by the workers of the network, whether a batch with
+    a single invalid signature is rejected, and whether the network falls back to verifying on the event loop after it is shut down.
+    '''
+    network, data = prepare_network(4, 40)
+    monkeypatch.setattr(consts, 'VERIFY_CHUNK_SIZE', 8)
+    submitted = []
+    submit = network.verify_executor.submit
+    monkeypatch.setattr(network.verify_executor, 'submit', lambda *args: submitted.append(args) or submit(*args))
+
+    units = decode_units(data)
+    assert asyncio.run(network._verify_signatures(units, 'sync', 'chunks'))
+    assert len(submitted) == (len(units) + 7) // 8
+
+    units[len(units) // 2].signature = units[0].signature
+    assert not asyncio.run(network._verify_signatures(units, 'sync', 'chunks'))
+
+    network.shutdown()
+    assert network.verify_executor is None
+    n_submitted = len(submitted)
+    assert not asyncio.run(network._verify_signatures(units, 'sync', 'chunks'))
+    assert asyncio.run(network._verify_signatures(decode_units(data), 'sync', 'chunks'))
+    assert len(submitted) == n_submitted
@@ -52,6 +52,54 @@ def test_trivial_single_level_below():
     assert not poset.below(U3, U)
 
 
+def test_below_unit_not_yet_added():
+    '''
+    Makes sure that Poset.below gives correct answers for a unit that has been prepared but not yet added to the poset,
+        in particular when this unit is a fork of a unit that is already in the poset.
+    '''
+    n_processes = 4
+    poset = Poset(n_processes = n_processes, use_tcoin = False)
+    dealing_units = [Unit(creator_id = i, parents = [], txs = []) for i in range(n_processes)]
+    for U in dealing_units:
+        poset.prepare_unit(U)
+        poset.add_unit(U)
+
+    U = Unit(creator_id = 0, parents = [dealing_units[0], dealing_units[1]], txs = [])
+    poset.prepare_unit(U)
+    poset.add_unit(U)
+
+    # V is a fork of U: it has the same self_predecessor, but is not added to the poset
+    V = Unit(creator_id = 0, parents = [dealing_units[0], dealing_units[2]], txs = [])
+    poset.prepare_unit(V)
+
+    assert poset.below(dealing_units[0], V)
+    assert poset.below(dealing_units[2], V)
+    assert not poset.below(U, V)
+    assert not poset.below(dealing_units[1], V)
+    assert poset.below(V, V)
+
+
+def test_ancestor_skip_pointers():
+    '''
+    Makes sure that Unit.ancestor returns the unit of the given height in a long chain of units of a single process.
+    '''
+    poset = Poset(n_processes = 1, use_tcoin = False)
+    chain = [Unit(creator_id = 0, parents = [], txs = [])]
+    poset.prepare_unit(chain[0])
+    poset.add_unit(chain[0])
+    for _ in range(100):
+        U = Unit(creator_id = 0, parents = [chain[-1]], txs = [])
+        poset.prepare_unit(U)
+        poset.add_unit(U)
+        chain.append(U)
+
+    for U in chain:
+        assert len(U.skips) == U.height.bit_length()
+        for height in range(U.height + 1):
+            assert U.ancestor(height) is chain[height]
+        assert U.ancestor(U.height + 1) is None
+
+
 def test_small_nonforking_below():
     generate_and_check_dag(
         checks= [check_all_pairs_below],
@@ -76,6 +76,8 @@ def check_all_floors(dag):
     for nodeU, U in unit_dict.items():
         for [tile, other] in zip(U.floor, [[unit_dict[nodeV] for nodeV in nodes] for nodes in dag.floor(nodeU)]):
             assert set(tile) == set(other)
+        # the bitmask of known forkers should consist of the processes with more than one maximal unit in the floor
+        assert U.floor.forkers == sum(1 << process_id for process_id, nodes in enumerate(dag.floor(nodeU)) if len(nodes) > 1)
 
 def test_small_nonforking():
     generate_and_check_dag(
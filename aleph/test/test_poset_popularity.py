@@ -0,0 +1,102 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from aleph.data_structures import Unit, Poset
+from aleph.utils import dag_utils
+from aleph.utils.generic_test import generate_and_check_dag
+
+
+def proves_popularity_by_dfs(poset, V, U_c):
+    '''
+    Checks whether V proves popularity of U_c by a DFS from V down to units that are not above U_c.
+    '''
+    level_V = poset.level(V)
+    if level_V <= U_c.level or not poset.below(U_c, V):
+        return False
+
+    seen_units = set([V])
+    seen_processes = set()
+    stack = [V]
+    while stack:
+        W = stack.pop()
+        if W.level <= level_V - 2 or (W.level == level_V - 1 and poset.is_prime(W)):
+            seen_processes.add(W.creator_id)
+        for W_parent in W.parents:
+            if W_parent not in seen_units and poset.below(U_c, W_parent):
+                stack.append(W_parent)
+                seen_units.add(W_parent)
+
+    return poset.is_quorum(len(seen_processes))
+
+
+def check_popularity(dag):
+    '''
+    Create a poset from a dag and check whether popularity proofs agree with the ones computed by DFS.
+    Half of the candidates are tracked from the very beginning, so that the data for their proofs is updated when adding units.
+    '''
+    poset, unit_dict = dag_utils.poset_from_dag(dag)
+    prime_units = [U for U in unit_dict.values() if poset.is_prime(U)]
+    for U_c in prime_units[::2]:
+        poset.track_popularity(U_c)
+
+    for V in prime_units:
+        for U_c in prime_units:
+            assert poset.proves_popularity(V, U_c) == proves_popularity_by_dfs(poset, V, U_c)
+
+
+def check_popularity_incremental(dag):
+    '''
+    Track all prime units as soon as they are added to the poset and check popularity proofs after adding every prime unit.
+    '''
+    poset, unit_dict = dag_utils.poset_from_dag(dag)
+    units = list(unit_dict.values())
+    incremental = Poset(poset.n_processes, use_tcoin = False)
+    prime_units = []
+    for U in units:
+        V = Unit(U.creator_id, [incremental.units[W.hash()] for W in U.parents], [])
+        incremental.prepare_unit(V)
+        incremental.add_unit(V)
+        if incremental.is_prime(V):
+            incremental.track_popularity(V)
+            prime_units.append(V)
+            for U_c in prime_units:
+                assert incremental.proves_popularity(V, U_c) == proves_popularity_by_dfs(incremental, V, U_c)
+
+
+def test_small_nonforking_popularity():
+    generate_and_check_dag(
+        checks= [check_popularity, check_popularity_incremental],
+        n_processes = 5,
+        n_units = 100,
+        repetitions = 5,
+    )
+
+
+def test_small_forking_popularity():
+    generate_and_check_dag(
+        checks= [check_popularity, check_popularity_incremental],
+        n_processes = 5,
+        n_units = 100,
+        repetitions = 10,
+        forking = lambda: 1
+    )
+
+
+def test_large_forking_popularity():
+    generate_and_check_dag(
+        checks= [check_popularity, check_popularity_incremental],
+        n_processes = 10,
+        n_units = 200,
+        repetitions = 3,
+        forking = lambda: 3
+    )
@@ -0,0 +1,46 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from aleph.utils import dag_utils
+from aleph.utils.generic_test import generate_and_check_dag
+
+
+def check_prime_units_below(dag):
+    '''
+    Create a poset from a dag and check whether the prime units below every unit at its level and one level below agree with the ones
+    found by checking all prime units with below.
+    '''
+    poset, unit_dict = dag_utils.poset_from_dag(dag)
+    for U in unit_dict.values():
+        for level in [U.level - 1, U.level]:
+            expected = [V for V in poset.get_all_prime_units_by_level(level) if poset.below(V, U)]
+            assert poset.get_prime_units_at_level_below_unit(level, U) == expected
+
+
+def test_small_nonforking_prime_below():
+    generate_and_check_dag(
+        checks= [check_prime_units_below],
+        n_processes = 5,
+        n_units = 100,
+        repetitions = 5,
+    )
+
+
+def test_small_forking_prime_below():
+    generate_and_check_dag(
+        checks= [check_prime_units_below],
+        n_processes = 5,
+        n_units = 100,
+        repetitions = 20,
+        forking = lambda: 2
+    )
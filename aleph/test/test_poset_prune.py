@@ -0,0 +1,171 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from aleph.crypto import SigningKey, VerifyKey
+from aleph.data_structures import Unit, Poset, Tx
+from aleph.process import Process
+from aleph.utils import dag_utils
+from aleph.utils.generic_test import simulate_with_checks
+import aleph.const as consts
+
+
+def check_no_stale_memos(poset):
+    '''
+    Checks that no data memoized by the poset in dicts keyed by unit ids refers to ids of pruned units, which are reused for new units.
+    '''
+    free = set(poset.unit_table.free)
+    assert not free & set(poset.timing_partial_results)
+    assert not free & set(U_id for memo in poset.timing_partial_results.values() for _, U_id in memo)
+    assert not free & set(poset.prime_below_masks)
+    assert not free & set(poset.popularity_index)
+    assert not free & set(V_id for memos in poset.coin_tosses.values() for memo in memos.values() for V_id in memo['valid'])
+
+
+def add_to_observers(U, poset, dag, results, observers):
+    '''
+    Adds a copy of U to two additional posets: one with pruning enabled and one without. Whenever a new timing unit is established
+    in the unpruned poset, the timing units of both posets are compared and the number of units kept in the pruned poset is recorded,
+    together with the number of rows of its unit table. Also checks that no memoized data refers to ids of pruned units.
+    '''
+    if observers is None:
+        observers = [Poset(poset.n_processes, 0, poset.crp, use_tcoin = False, prune_depth = 2),
+                     Poset(poset.n_processes, 0, poset.crp, use_tcoin = False)]
+    pruned, reference = observers
+
+    for observer in observers:
+        U_new = Unit(U.creator_id, [observer.units[V.hash()] for V in U.parents], U.transactions())
+        observer.prepare_unit(U_new)
+        assert observer.check_compliance(U_new)
+        observer.add_unit(U_new)
+        if observer.is_prime(U_new):
+            observer.attempt_timing_decision()
+            observer.prune()
+
+    assert [T.hash() for T in pruned.timing_units] == [T.hash() for T in reference.timing_units]
+    assert all(level >= pruned.level_pruned for level in pruned.prime_units_by_level)
+    for observer in observers:
+        max_height = max(V.height for V in observer.units.values())
+        indexed = [V for process_id in range(observer.n_processes) for V in observer.units_by_process_in_range(process_id, -1, max_height)]
+        assert set(V.hash() for V in indexed) == set(observer.units)
+        assert len(observer.unit_table) == len(observer.units)
+        assert len(set(V.id for V in observer.units.values())) == len(observer.units)
+        assert all(observer.unit_table.creator[V.id] == V.creator_id for V in observer.units.values())
+    check_no_stale_memos(pruned)
+    results.append((len(pruned.units), len(reference.units), pruned.unit_table.size))
+    return observers
+
+
+def test_prune_small():
+    '''
+    Makes sure that pruning does not influence timing decisions and that the number of units kept in the poset does not grow with its size.
+    '''
+    n_processes = 4
+    results = simulate_with_checks(n_processes, 400, post_prepare = add_to_observers, seed = 7)
+    n_pruned, n_reference, _ = results[-1]
+    assert n_reference == 400
+    assert max(n_pruned for n_pruned, _, _ in results[200:]) < 50
+    # ids of pruned units are reused
+    assert results[-1][2] < 50
+
+
+def add_with_forker(U, poset, dag, results, observers):
+    '''
+    Like add_to_observers, but additionally both observers receive a fork of height 1 of process 0 right after its dealing unit.
+    For every unit kept in the pruned poset checks that the members of its floor (possibly already pruned) of process 0 are above
+    the dealing unit of process 0 in both posets, since in a forking situation this requires walking down through pruned units.
+    '''
+    observers = add_to_observers(U, poset, dag, results, observers)
+    pruned, reference = observers
+    if U.creator_id == 0 and not U.parents:
+        for observer in observers:
+            U_fork = Unit(0, [observer.units[U.hash()]], [Tx('fork', 'fork', 1)])
+            observer.prepare_unit(U_fork)
+            observer.add_unit(U_fork)
+
+    if reference.forking_height[0] == 1:
+        D_hash = reference.dealing_units[0][0].hash()
+        for V in pruned.units.values():
+            V_reference = reference.units[V.hash()]
+            for W, W_reference in zip(V.floor[0], V_reference.floor[0]):
+                assert W.hash() == W_reference.hash()
+                assert pruned.below_within_process(pruned.units[D_hash], W)
+                assert reference.below_within_process(reference.units[D_hash], W_reference)
+    return observers
+
+
+def test_prune_forker():
+    '''
+    Makes sure that pruning does not break comparisons of units of a forking process with its dealing unit.
+    '''
+    n_processes = 4
+    results = simulate_with_checks(n_processes, 300, post_prepare = add_with_forker, seed = 7)
+    n_pruned, n_reference, _ = results[-1]
+    assert n_reference == 301
+    assert max(n_pruned for n_pruned, _, _ in results[200:]) < 50
+
+
+def test_prune_linear_order(monkeypatch):
+    '''
+    Feeds the same units to two processes, with pruning enabled and disabled, and makes sure that the process with pruning keeps only
+    a suffix of the linear order of the other process, and that this suffix does not grow with the number of units.
+    '''
+    monkeypatch.setattr(consts, 'USE_TCOIN', 0)
+    monkeypatch.setattr(consts, 'SNAPSHOT_FILE', None)
+    n_processes, n_units = 4, 400
+    source, _ = dag_utils.poset_from_dag(dag_utils.generate_random_nonforking(n_processes, n_units))
+    sks = [SigningKey() for _ in range(n_processes)]
+    pks = [VerifyKey.from_SigningKey(sk) for sk in sks]
+    addresses = [('127.0.0.1', 9000 + i) for i in range(n_processes)]
+
+    processes = []
+    for prune_depth in [2, None]:
+        monkeypatch.setattr(consts, 'PRUNE_DEPTH', prune_depth)
+        processes.append(Process(n_processes, 0, sks[0], pks[0], addresses, pks, None))
+    pruned, reference = processes
+
+    sizes = []
+    for U in source.units_as_added:
+        for process in processes:
+            U_new = Unit(U.creator_id, [process.poset.units[V.hash()] for V in U.parents], U.transactions())
+            process.poset.prepare_unit(U_new)
+            process.add_unit_and_extend_linear_order(U_new)
+        assert pruned.linear_order == reference.linear_order[pruned.linear_order_pruned:]
+        sizes.append(len(pruned.linear_order))
+    for process in processes:
+        process.network.shutdown()
+
+    assert len(reference.linear_order) > 300
+    assert max(sizes[200:]) < 50
+
+
+def check_max_units_by_level(U, poset, dag, results, observers):
+    '''
+    Like add_to_observers, but additionally checks that max_units_by_level of the pruned poset contains exactly the maximal units of
+    levels that are not pruned, and no empty or pruned levels.
+    '''
+    observers = add_to_observers(U, poset, dag, results, observers)
+    for observer in observers:
+        by_level = {}
+        for V in observer.max_units:
+            if V.level >= observer.level_pruned:
+                by_level.setdefault(V.level, []).append(V)
+        assert {level: list(Vs) for level, Vs in observer.max_units_by_level.items()} == by_level
+    return observers
+
+
+def test_prune_max_units_by_level():
+    '''
+    Makes sure that levels are removed from max_units_by_level when they run out of maximal units or get pruned.
+    '''
+    results = simulate_with_checks(4, 300, post_prepare = check_max_units_by_level, seed = 7)
+    assert len(results) > 0
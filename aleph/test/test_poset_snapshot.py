@@ -0,0 +1,118 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import tempfile
+
+from aleph.data_structures import Unit, Poset
+from aleph.utils import dag_utils
+from aleph.utils.generic_test import generate_and_check_dag, simulate_with_checks
+
+
+def restore(poset, file_name):
+    '''
+    Writes a snapshot of the poset to file and reads it into a fresh poset.
+    '''
+    poset.write_snapshot(file_name, extra = {'answer': 42})
+    restored = Poset(poset.n_processes, poset.process_id, poset.crp, use_tcoin = False, prune_depth = poset.prune_depth)
+    assert restored.read_snapshot(file_name) == {'answer': 42}
+    return restored
+
+
+def check_restored(poset, restored):
+    '''
+    Checks that the restored poset has the same units, levels, floors and order as the original one.
+    '''
+    assert list(restored.units) == list(poset.units)
+    assert [U.hash() for U in restored.units_as_added] == [U.hash() for U in poset.units_as_added]
+    assert restored.forking_height == poset.forking_height
+    assert restored.level_reached == poset.level_reached
+    assert restored.level_pruned == poset.level_pruned
+    assert [T.hash() for T in restored.timing_units] == [T.hash() for T in poset.timing_units]
+    assert set(U.hash() for U in restored.max_units) == set(U.hash() for U in poset.max_units)
+    assert sorted(restored.prime_units_by_level) == sorted(poset.prime_units_by_level)
+    for U_hash, U in poset.units.items():
+        V = restored.units[U_hash]
+        assert V.level == U.level
+        assert [W.hash() for W in V.parents] == [W.hash() for W in U.parents]
+        assert (V.floor.heights == U.floor.heights).all()
+        assert [[W.hash() for W in Ws] for Ws in V.floor] == [[W.hash() for W in Ws] for Ws in U.floor]
+
+
+def check_snapshot(dag):
+    '''
+    Creates a poset from a dag, restores it from a snapshot and checks that it behaves exactly as the original one.
+    '''
+    poset, unit_dict = dag_utils.poset_from_dag(dag)
+    with tempfile.TemporaryDirectory() as dir_name:
+        restored = restore(poset, os.path.join(dir_name, 'poset.snapshot'))
+    check_restored(poset, restored)
+
+    units = list(unit_dict.values())
+    for U, V in zip(units, units[::-1]):
+        assert restored.below(restored.units[U.hash()], restored.units[V.hash()]) == poset.below(U, V)
+
+
+def test_small_nonforking_snapshot():
+    generate_and_check_dag(
+        checks= [check_snapshot],
+        n_processes = 5,
+        n_units = 50,
+        repetitions = 5,
+    )
+
+
+def test_small_forking_snapshot():
+    generate_and_check_dag(
+        checks= [check_snapshot],
+        n_processes = 5,
+        n_units = 50,
+        repetitions = 10,
+        forking = lambda: 1
+    )
+
+
+def add_to_observers(U, poset, dag, results, observers):
+    '''
+    Adds a copy of U to two additional posets with pruning enabled. Every 50 units the first one is replaced by a copy restored from
+    its snapshot, so that the remaining units are added on top of a restored poset. The timing units of both posets are compared.
+    '''
+    if observers is None:
+        observers = [Poset(poset.n_processes, 0, poset.crp, use_tcoin = False, prune_depth = 2) for _ in range(2)]
+
+    for observer in observers:
+        U_new = Unit(U.creator_id, [observer.units[V.hash()] for V in U.parents], U.transactions())
+        observer.prepare_unit(U_new)
+        assert observer.check_compliance(U_new)
+        observer.add_unit(U_new)
+        if observer.is_prime(U_new):
+            observer.attempt_timing_decision()
+            observer.prune()
+
+    restored, reference = observers
+    if len(results) % 50 == 49:
+        with tempfile.TemporaryDirectory() as dir_name:
+            restored = restore(restored, os.path.join(dir_name, 'poset.snapshot'))
+        check_restored(reference, restored)
+
+    assert [T.hash() for T in restored.timing_units] == [T.hash() for T in reference.timing_units]
+    results.append(len(reference.timing_units))
+    return [restored, reference]
+
+
+def test_pruned_snapshot():
+    '''
+    Makes sure that a pruned poset restored from snapshots reaches the same timing decisions as a poset that was never restored.
+    '''
+    results = simulate_with_checks(4, 400, post_prepare = add_to_observers, seed = 7)
+    assert results[-1] > 0
@@ -54,3 +54,56 @@ def test_threshold_coin_toss():
     assert results[-1][0] > consts.ADD_SHARES, "Too low poset generated"
 
 
+def fail_combine(*args):
+    assert False, "Coin shares were combined again instead of using the memoized coin."
+
+
+def toss_twice_for_prime(U, poset, dag, results, additional_args):
+    '''
+    Same as toss_for_prime, but every coin is tossed twice, the second time using the memoized results of the first toss. If the toss
+    combined coin shares, the coin is tossed once more by another prime unit at the same level, which should reuse the combined coin.
+    '''
+    n_results = len(results)
+    primes = toss_for_prime(U, poset, dag, results, additional_args)
+    if len(results) > n_results:
+        level, coin = results.pop()
+        U_c = next(U_c for U_c in primes if U_c.level<=U.level - 4)
+        coin_again = poset.toss_coin(U_c, U)
+        if level <= consts.ADD_SHARES:
+            results.append((level, coin, coin_again, None, None))
+            return primes
+
+        # the coin is combined with the threshold coin dealt in the first dealing unit of the first prime unit at level-1 below U
+        U_dealing = poset.first_dealing_unit(poset.get_prime_units_at_level_below_unit(level-1, U)[0])
+        memoized = poset.coin_tosses[level-1][U_dealing.id]['coin']
+        coin_other = None
+        others = [W for W in poset.get_all_prime_units_by_level(level) if W is not U and
+                  poset.first_dealing_unit(poset.get_prime_units_at_level_below_unit(level-1, W)[0]) is U_dealing]
+        if others:
+            t_coin = poset.threshold_coin(U_dealing)
+            t_coin.combine_coin_shares = fail_combine
+            try:
+                coin_other = poset.toss_coin(U_c, others[0])
+            finally:
+                del t_coin.combine_coin_shares
+        results.append((level, coin, coin_again, memoized, coin_other))
+    return primes
+
+
+def test_threshold_coin_toss_memo():
+    '''
+    Test whether tossing the same coin again gives the same result, whether tosses by combining shares are memoized and whether
+    other prime units at the same level reuse the memoized coin.
+    '''
+    results = simulate_with_checks(
+            6,
+            320,
+            post_prepare = toss_twice_for_prime,
+            use_tcoin = True,
+            seed = 0)
+    assert all(coin == coin_again for _, coin, coin_again, _, _ in results)
+    combined = [(coin, memoized, coin_other) for level, coin, _, memoized, coin_other in results if level > consts.ADD_SHARES]
+    assert combined, "Too low poset generated"
+    assert all(memoized == (coin, True) for coin, memoized, _ in combined)
+    assert any(coin_other is not None for _, _, coin_other in combined)
+    assert all(coin_other == coin for coin, _, coin_other in combined if coin_other is not None)
@@ -0,0 +1,55 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from aleph.data_structures import Unit, Poset
+from aleph.utils.generic_test import simulate_with_checks
+
+
+def add_to_observers(U, poset, dag, results, observers):
+    '''
+    Adds a copy of U to two additional posets: one with pruning enabled and one without. Whenever new timing units are established,
+    the timing rounds computed by both posets are compared with the ones obtained by scanning all the units of the unpruned poset.
+    '''
+    if observers is None:
+        observers = [Poset(poset.n_processes, 0, poset.crp, use_tcoin = False, prune_depth = 1),
+                     Poset(poset.n_processes, 0, poset.crp, use_tcoin = False)]
+    pruned, reference = observers
+
+    new_timing_units = []
+    for observer in observers:
+        U_new = Unit(U.creator_id, [observer.units[V.hash()] for V in U.parents], U.transactions())
+        observer.prepare_unit(U_new)
+        observer.add_unit(U_new)
+        if observer.is_prime(U_new):
+            new_timing_units.append(observer.attempt_timing_decision())
+
+    for T in (new_timing_units[-1] if new_timing_units else []):
+        k = T.level
+        T_prev = reference.timing_units[k-2] if k > 1 else None
+        expected = [V for V in reference.units_as_added if reference.below(V, T) and (T_prev is None or not reference.below(V, T_prev))]
+        expected = [V.hash() for V in reference.break_ties(expected)]
+        assert [V.hash() for V in reference.break_ties(reference.timing_round(k))] == expected
+        assert [V.hash() for V in pruned.break_ties(pruned.timing_round(k))] == expected
+        results.append(k)
+
+    pruned.prune()
+    return observers
+
+
+def test_timing_round():
+    '''
+    Makes sure that timing rounds computed by traversing the poset down from timing units agree with the ones obtained by brute force.
+    '''
+    results = simulate_with_checks(4, 300, post_prepare = add_to_observers, seed = 11)
+    assert results == list(range(1, len(results) + 1))
+    assert len(results) > 5
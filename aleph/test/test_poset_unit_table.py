@@ -0,0 +1,40 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from aleph.utils import dag_utils
+from aleph.utils.generic_test import generate_and_check_dag
+
+
+def check_unit_table(dag):
+    '''
+    Create a poset from a dag (with more units than the initial capacity of the unit table) and check whether the units got distinct
+    consecutive ids and whether the columns of the table agree with the units.
+    '''
+    poset, unit_dict = dag_utils.poset_from_dag(dag)
+    table = poset.unit_table
+    assert len(table) == len(poset.units)
+    assert sorted(U.id for U in poset.units.values()) == list(range(len(table)))
+    timing_units = set(poset.timing_units)
+    for U in poset.units.values():
+        assert table.creator[U.id] == U.creator_id
+        assert table.is_prime[U.id] == (not U.parents or U.level > U.self_predecessor.level)
+        assert table.is_timing[U.id] == (U in timing_units)
+
+
+def test_unit_table():
+    generate_and_check_dag(
+        checks= [check_unit_table],
+        n_processes = 10,
+        n_units = 1500,
+        repetitions = 1,
+    )
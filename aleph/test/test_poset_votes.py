@@ -0,0 +1,85 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import random
+
+from aleph.data_structures import Unit, Poset
+from aleph.utils import dag_utils
+from aleph.utils.generic_test import generate_and_check_dag, generate_crp
+import aleph.const as consts
+
+
+def check_vote_engines(dag):
+    '''
+    Builds two posets from a dag: one computing votes recursively and one using vote matrices. Checks that after every prime unit
+    both establish the same timing units, and that in the end they agree on the popularity of all prime units.
+    '''
+    crp = generate_crp(dag.n_processes)
+    posets = [Poset(dag.n_processes, crp = crp, use_tcoin = False, matrix_votes = matrix_votes) for matrix_votes in [False, True]]
+    units = [{} for _ in posets]
+
+    for unit_name in dag.sorted():
+        timing_units = []
+        for poset, unit_dict in zip(posets, units):
+            U = Unit(dag.pid(unit_name), [unit_dict[parent] for parent in dag.parents(unit_name)], [])
+            poset.prepare_unit(U)
+            poset.add_unit(U)
+            unit_dict[unit_name] = U
+            if poset.is_prime(U):
+                timing_units.append([T.hash() for T in poset.attempt_timing_decision()])
+        if timing_units:
+            assert timing_units[0] == timing_units[1]
+
+    recursive, matrix = posets
+    assert [T.hash() for T in recursive.timing_units] == [T.hash() for T in matrix.timing_units]
+    for level in range(recursive.level_reached - consts.VOTING_LEVEL):
+        for U_c in recursive.get_all_prime_units_by_level(level):
+            assert recursive.decide_unit_is_popular(U_c) == matrix.decide_unit_is_popular(matrix.units[U_c.hash()])
+
+
+def test_nonforking_votes():
+    generate_and_check_dag(
+        checks = [check_vote_engines],
+        n_processes = 5,
+        n_units = 200,
+        repetitions = 5,
+    )
+
+
+def test_forking_votes():
+    generate_and_check_dag(
+        checks = [check_vote_engines],
+        n_processes = 7,
+        n_units = 300,
+        repetitions = 5,
+        forking = lambda: 2
+    )
+
+
+def test_lagging_votes():
+    '''
+    Uses dags in which prime units of some processes are not popular, so that the decisions require voting.
+    '''
+    random.seed(123456789)
+    for _ in range(3):
+        check_vote_engines(dag_utils.generate_random_lagging(7, 300, 2))
+
+
+def test_pi_delta_votes(monkeypatch):
+    '''
+    Switches to the pi-delta algorithm early, so that it is used for many decisions.
+    '''
+    monkeypatch.setattr(consts, 'PI_DELTA_LEVEL', consts.VOTING_LEVEL + 2)
+    random.seed(123456789)
+    for _ in range(3):
+        check_vote_engines(dag_utils.generate_random_lagging(7, 300, 2))
@@ -37,6 +37,12 @@ def test_tcoin():
         pid = random.randrange(n_parties)
         assert TCs[pid].verify_coin_share(share, i, nonce)
 
+    # verify all shares at once, and after breaking one of them
+    pid = random.randrange(n_parties)
+    assert TCs[pid].verify_coin_shares(dict(enumerate(shares)), nonce) == dict(enumerate(shares))
+    broken = {**dict(enumerate(shares)), 2: shares[1]}
+    assert TCs[pid].verify_coin_shares(broken, nonce) == {i: share for i, share in enumerate(shares) if i != 2}
+
     _shares = {i: shares[i] for i in random.sample(range(n_parties), threshold)}
 
     pid = random.randrange(n_parties)
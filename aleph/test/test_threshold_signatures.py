@@ -11,6 +11,7 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
 
+from functools import reduce
 from random import sample
 
 from aleph.crypto.threshold_signatures import generate_keys
@@ -42,3 +43,36 @@ def test_combine_signature():
     signature = VK.combine_shares(_shares)
 
     assert VK.verify_signature(signature, msg_hash)
+
+
+def test_verify_shares():
+    '''
+    Checks whether a batch of valid shares passes verification and whether replacing one of them with a share of a different party
+    or of a different message makes the batch fail.
+    '''
+    n_parties, threshold = 10, 5
+    VK, SKs = generate_keys(n_parties, threshold)
+
+    msg_hash = VK.hash_msg('there is no spoon')
+    shares = {i: SKs[i].generate_share(msg_hash) for i in range(n_parties)}
+    assert VK.verify_shares(shares, msg_hash)
+    assert VK.verify_shares({}, msg_hash)
+
+    assert not VK.verify_shares({**shares, 3: shares[4]}, msg_hash)
+    assert not VK.verify_shares({**shares, 3: SKs[3].generate_share(VK.hash_msg('there is a spoon'))}, msg_hash)
+
+
+def test_combine_shares_multi_exp():
+    '''
+    Checks whether combining enough shares for a multi-exponentiation to be used gives the same signature as raising every share
+    to its Lagrange coefficient separately.
+    '''
+    n_parties, threshold = 40, 20
+    VK, SKs = generate_keys(n_parties, threshold)
+
+    msg_hash = VK.hash_msg('there is no spoon')
+    shares = {i: SKs[i].generate_share(msg_hash) for i in sample(range(n_parties), threshold)}
+    signature = VK.combine_shares(shares)
+
+    assert signature == reduce(lambda x, y: x*y, [share ** VK.lagrange(shares.keys(), i) for i, share in shares.items()])
+    assert VK.verify_signature(signature, msg_hash)
@@ -0,0 +1,214 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from itertools import product
+import struct
+
+import pytest
+
+from aleph.data_structures import Poset, Unit, Tx, TxBatch, DecodeError, encode_units, decode_units
+from aleph.data_structures.unit import UNITS_FORMAT_HEADER
+from aleph.utils import dag_utils
+from aleph.utils.generic_test import generate_and_check_dag
+from aleph.config import PAIRING_GROUP
+import aleph.const as consts
+
+
+def check_encoding(dag):
+    '''
+    Create a poset from a dag, encode its units in batches and check whether decoding gives the same units, with parents given by hashes.
+    Parents of units in later batches are outside of the batch.
+    '''
+    poset, _ = dag_utils.poset_from_dag(dag)
+    units = poset.units_as_added
+    for batch in [units[:len(units)//2], units[len(units)//2:]]:
+        decoded = decode_units(encode_units(batch))
+        assert [U.hash() for U in decoded] == [U.hash() for U in batch]
+        assert [U.parents for U in decoded] == [U.parents_hashes() for U in batch]
+        assert [U.transactions() for U in decoded] == [U.transactions() for U in batch]
+
+
+def check_unordered_encoding(dag):
+    '''
+    Encode the units of a poset built from a dag in a non-topological order, with some units appearing twice, and check whether
+    decoding gives the same units with the same parents.
+    '''
+    poset, _ = dag_utils.poset_from_dag(dag)
+    units = list(reversed(poset.units_as_added))
+    batch = units + units[::3]
+    decoded = decode_units(encode_units(batch))
+    assert [U.hash() for U in decoded] == [U.hash() for U in batch]
+    assert [U.parents for U in decoded] == [U.parents_hashes() for U in batch]
+
+
+def check_malformed_encoding(dag):
+    '''
+    Check whether truncated or corrupted encodings of units are rejected with DecodeError.
+    '''
+    poset, _ = dag_utils.poset_from_dag(dag)
+    # the first unit in the batch has parents, so it starts with a reference to a parent
+    data = encode_units([U for U in poset.units_as_added if U.parents])
+    corrupted = [data[:n] for n in range(0, len(data), 7)] + [data + b'x']
+    # replace the first reference to a parent by a number out of range
+    offset = UNITS_FORMAT_HEADER.size + 2
+    corrupted.append(data[:offset] + struct.pack('<i', 10**6) + data[offset+4:])
+    # a signature that is not 64 bytes long would make verifying it raise an exception other than BadSignatureError
+    U = poset.units_as_added[-1]
+    U.signature = bytes(63)
+    corrupted.append(encode_units([U]))
+    for bad in corrupted:
+        with pytest.raises(DecodeError):
+            decode_units(bad)
+
+
+def test_small_encoding():
+    generate_and_check_dag(
+        checks= [check_encoding],
+        n_processes = 5,
+        n_units = 100,
+        repetitions = 5,
+    )
+
+
+def test_unordered_and_malformed_encoding():
+    generate_and_check_dag(
+        checks= [check_unordered_encoding, check_malformed_encoding],
+        n_processes = 4,
+        n_units = 40,
+        repetitions = 3,
+    )
+
+
+def test_small_forking_encoding():
+    generate_and_check_dag(
+        checks= [check_encoding],
+        n_processes = 5,
+        n_units = 100,
+        repetitions = 5,
+        forking = lambda: 2
+    )
+
+
+def test_dealing_unit_encoding():
+    '''
+    Check whether the threshold coin in a decoded dealing unit is the same as in the original one, with pairing elements serialized
+    both uncompressed and compressed, and whether its keys are deserialized only when accessed.
+    '''
+    poset = Poset(n_processes = 4, process_id = 0, use_tcoin = True)
+    U = Unit(0, [], [])
+    poset.add_tcoin_to_dealing_unit(U)
+    compress_coin_shares = consts.COMPRESS_COIN_SHARES
+    try:
+        for compression in [False, True]:
+            consts.COMPRESS_COIN_SHARES = compression
+            U.invalidate_encoding()
+            V, = decode_units(encode_units([U]))
+            assert V.hash() == U.hash()
+            assert V.coin_shares['vk'] == U.coin_shares['vk']
+            assert V.coin_shares['sks'][2] == U.coin_shares['sks'][2]
+            assert V.coin_shares['sks'].elements[1] is None
+            assert list(V.coin_shares['vks']) == U.coin_shares['vks']
+    finally:
+        consts.COMPRESS_COIN_SHARES = compress_coin_shares
+
+
+def test_malformed_coin_shares(monkeypatch):
+    '''
+    Check whether malformed pairing elements in received units are reported by DecodeError: when decoding the unit for the public key
+    of a threshold coin, when accessing a lazily deserialized coin share, and by the compliance check for the secret key of this process.
+    A malformed verification key of a process is not checked by compliance, but makes the coin shares of this process invalid.
+    '''
+    monkeypatch.setattr(consts, 'COMPRESS_COIN_SHARES', False)
+    poset, other_poset = [Poset(n_processes = 4, process_id = process_id, use_tcoin = True) for process_id in [0, 1]]
+    U = Unit(0, [], [Tx('a', 'b', 1)])
+    poset.add_tcoin_to_dealing_unit(U)
+    W = Unit(0, [U], [Tx('a', 'b', 2)], coin_shares = [U.coin_shares['vks'][1]])
+
+    # the type of a serialized pairing element is given by the number before ':', there is no type 7
+    def corrupt(data, element):
+        serialized = PAIRING_GROUP.serialize(element, compression = False)
+        assert data.count(serialized) == 1
+        return data.replace(serialized, b'7:' + serialized[2:])
+
+    assert poset.check_threshold_coin_included(decode_units(encode_units([U]))[0])
+    V, = decode_units(corrupt(encode_units([U]), U.coin_shares['sks'][0]))
+    assert not poset.check_threshold_coin_included(V)
+    assert other_poset.check_threshold_coin_included(V)
+    with pytest.raises(DecodeError):
+        decode_units(corrupt(encode_units([U]), U.coin_shares['vk']))
+
+    shares = {0: poset.threshold_coin(U).create_coin_share(5), 1: other_poset.threshold_coin(U).create_coin_share(5)}
+    V, = decode_units(encode_units([U]))
+    assert poset.verify_coin_shares(V, shares, 5) == shares
+    V, = decode_units(corrupt(encode_units([U]), U.coin_shares['vks'][0]))
+    assert poset.check_threshold_coin_included(V)
+    assert V.coin_shares['vks'].elements == [None] * 4
+    assert poset.verify_coin_shares(V, shares, 5) == {1: shares[1]}
+
+    V, = decode_units(corrupt(encode_units([W]), W.coin_shares[0]))
+    with pytest.raises(DecodeError):
+        V.coin_shares[0]
+
+
+def test_transactions_codecs():
+    '''
+    Check whether transactions of a decoded unit are the same as in the original one for every codec and format of transactions,
+    and whether they are kept encoded until requested.
+    '''
+    hex_keys = ['%064x' % (i**5) for i in range(10)]
+    names = ['Alice', 'Bob', 'Carol']
+    txs_codec, txs_format = consts.TXS_CODEC, consts.TXS_FORMAT
+    try:
+        for keys in [hex_keys, names]:
+            txs = [Tx(keys[i % len(keys)], keys[(i+1) % len(keys)], i) for i in range(100)]
+            for codec, encoding in product(['none', 'zlib', 'bz2', 'lzma'], ['batch', 'pickle']):
+                consts.TXS_CODEC, consts.TXS_FORMAT = codec, encoding
+                U = Unit(0, [], txs)
+                V, = decode_units(encode_units([U]))
+                assert V.hash() == U.hash()
+                assert V.txs.bytes() == U.txs.bytes()
+                assert list(V.iter_transactions()) == txs
+                assert V.transactions() == txs
+                assert list(V.txs.batch()) == txs
+    finally:
+        consts.TXS_CODEC, consts.TXS_FORMAT = txs_codec, txs_format
+
+
+def test_tx_batch():
+    '''
+    Check whether a batch of transactions with amounts not fitting in 32 bits and a shared account table is decoded correctly.
+    '''
+    txs = [Tx('a', 'b', -5), Tx('b', 'a', 2**40), Tx('a', 'c', 0)]
+    batch = TxBatch.from_txs(txs)
+    assert batch.accounts == ['a', 'b', 'c']
+    assert list(TxBatch.from_bytes(batch.to_bytes())) == txs
+    assert not TxBatch.encodable([Tx('a', 'b', 1.5)])
+
+
+def test_malformed_tx_batch():
+    '''
+    Check whether truncated or otherwise malformed encodings of batches of transactions are rejected with ValueError.
+    '''
+    hex_keys = ['%064x' % (i**5) for i in range(3)]
+    for txs in [[Tx('a', 'bb', 1), Tx('bb', 'c', 2)], [Tx(hex_keys[0], hex_keys[1], 1), Tx(hex_keys[2], hex_keys[0], 2**40)]]:
+        batch = TxBatch.from_txs(txs)
+        data = batch.to_bytes()
+        malformed = [data[:n] for n in range(len(data))] + [data + b'x']
+        # an invalid width of the index columns (the byte after the flags and two counts)
+        malformed.append(data[:9] + b'\x03' + data[10:])
+        # the receiver of the last transaction out of the account table (the receivers are followed by the amounts)
+        end = len(data) - batch.amounts.nbytes
+        malformed.append(data[:end-2] + b'\x07\x00' + data[end:])
+        for encoding in malformed:
+            with pytest.raises(ValueError):
+                TxBatch.from_bytes(encoding)
@@ -11,6 +11,8 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import pickle
+
 from aleph.crypto.keys import SigningKey, VerifyKey
 from aleph.data_structures import Unit
 from aleph.process import Process
@@ -45,3 +47,20 @@ def test_process_signing():
     msg = U.bytestring()
     assert vk.verify_signature(U.signature, msg)
 
+
+
+def test_signing_after_pickling():
+    '''
+    Tests whether a signed unit sent as a pickle keeps its hash and signature, and whether its encoding is reused when it is sent again.
+    '''
+    sk = SigningKey()
+    vk = VerifyKey.from_SigningKey(sk)
+    U = Unit(0,[],[1, 2, 3])
+    U.signature = sk.sign(U.bytestring())
+
+    V = pickle.loads(pickle.dumps(U))
+    assert V.hash() == U.hash()
+    assert V.transactions() == [1, 2, 3]
+    assert vk.verify_signature(V.signature, V.bytestring())
+    assert V.encoding() == U.encoding()
+    assert U.encoding() is U.encoding()
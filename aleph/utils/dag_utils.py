@@ -138,6 +138,37 @@ def generate_random_nonforking(n_processes, n_units, file_name = None):
 
 
 
+def generate_random_lagging(n_processes, n_units, n_lagging, file_name = None):
+    '''
+    Generate a random non-forking poset with n_processes processes, of which n_lagging are rarely chosen as parents by other processes,
+    and optionally save it to file_name. Prime units of lagging processes are often not popular, hence deciding about them requires voting.
+    :param int n_processes: the number of processes in poset
+    :param int n_units: the number of units in the process beyond n_processes initial units,
+                        hence the total number of units is (n_processes + n_units)
+    :param int n_lagging: the number of lagging processes
+    :returns: a DAG instance
+    '''
+    lagging = set(random.sample(range(n_processes), n_lagging))
+    process_heights = [0] * n_processes
+    dag = DAG(n_processes)
+    for process_id in range(n_processes):
+        dag.add(generate_unit_name(0, process_id), process_id, [])
+
+    for _ in range(n_units):
+        process_id = random.choice(range(n_processes))
+        all_but_process_id = [i for i in range(n_processes) if i != process_id]
+        weights = [0.02 if i in lagging else 1 for i in all_but_process_id]
+        parent_processes = [process_id] + random.choices(all_but_process_id, weights)
+        unit_height = process_heights[process_id] + 1
+        unit_name = generate_unit_name(unit_height, process_id)
+        dag.add(unit_name, process_id, [generate_unit_name(process_heights[i], i) for i in parent_processes])
+        process_heights[process_id] += 1
+
+    if file_name:
+        dag_to_file(dag, file_name)
+    return dag
+
+
 def generate_random_forking(n_processes, n_units, n_forkers, file_name = None):
     '''
     Generates a random poset with n_processes processes, of which n_forkers are forking and saves it to file_name.
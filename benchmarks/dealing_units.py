@@ -0,0 +1,51 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from time import time
+
+from aleph.data_structures import Poset, Unit, encode_units, decode_units
+import aleph.const as consts
+
+
+def measure(n_processes, n_repetitions = 5):
+    '''
+    Measures the size of the encoding of a dealing unit, and the time of serializing and deserializing all its pairing elements,
+    with pairing elements serialized uncompressed and compressed.
+    '''
+    poset = Poset(n_processes, 0, use_tcoin = True)
+    U = Unit(0, [], [])
+    poset.add_tcoin_to_dealing_unit(U)
+
+    line = f'n_processes {n_processes:4}'
+    for compression in [False, True]:
+        consts.COMPRESS_COIN_SHARES = compression
+        time_serialize, time_deserialize = 0, 0
+        for _ in range(n_repetitions):
+            U.invalidate_encoding()
+            start = time()
+            data = encode_units([U])
+            time_serialize += time()-start
+
+            start = time()
+            V, = decode_units(data)
+            list(V.coin_shares['sks']), list(V.coin_shares['vks'])
+            time_deserialize += time()-start
+
+        line += (f' | compressed {int(compression)} {len(data)/1024:9.1f}KiB serialize {1000*time_serialize/n_repetitions:7.1f}ms '
+                 f'deserialize {1000*time_deserialize/n_repetitions:7.1f}ms')
+    print(line)
+
+
+if __name__ == '__main__':
+    for n_processes in [16, 32, 64, 128, 256, 512]:
+        measure(n_processes)
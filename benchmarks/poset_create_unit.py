@@ -0,0 +1,51 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import random
+from time import time
+
+from aleph.data_structures import Poset
+from aleph.actions import create_unit
+
+
+def measure_time(n_processes, n_rounds):
+    '''
+    Builds a poset in rounds: in every round all processes create units with create_unit based on the same state of the poset, and only
+    then the units are added with add_unit, so that there are many maximal units. Measures the time spent in both of these functions.
+    '''
+    poset = Poset(n_processes, use_tcoin = False)
+    time_create, time_add = 0, 0
+    n_units = 0
+    for _ in range(n_rounds):
+        creators = random.sample(range(n_processes), n_processes)
+
+        start = time()
+        units = [create_unit(poset, creator_id, [], num_parents = n_processes) for creator_id in creators]
+        time_create += time()-start
+
+        start = time()
+        for U in units:
+            if U is not None:
+                poset.prepare_unit(U)
+                poset.add_unit(U)
+                n_units += 1
+        time_add += time()-start
+
+    print(f'n_processes {n_processes:4} n_units {n_units:6} level {poset.level_reached:4} max_units {len(poset.max_units):4} '
+          f'create_unit {1000*time_create/n_units:.3f}ms add_unit {1000*time_add/n_units:.3f}ms per unit')
+
+
+if __name__ == '__main__':
+    random.seed(123456789)
+    for n_processes in [16, 32, 64, 128, 256]:
+        measure_time(n_processes, 20)
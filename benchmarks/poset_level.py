@@ -0,0 +1,71 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import random
+from time import time
+
+from aleph.utils import dag_utils
+
+
+def level_by_below(poset, U):
+    '''
+    Reference implementation of Poset.level: for every process look for a prime unit at level m below U using Poset.below.
+    '''
+    m = max(V.level for V in U.parents)
+    processes_below = 0
+    for process_id in range(poset.n_processes):
+        for V in poset.prime_units_by_level[m][process_id]:
+            if poset.below(V, U) and (V is not U):
+                processes_below += 1
+                break
+        if not poset.is_quorum(processes_below + poset.n_processes - 1 - process_id):
+            break
+    return m+1 if poset.is_quorum(processes_below) else m
+
+
+def measure_time(n_processes, n_units, n_forkers, repetitions):
+    print('n_processes', n_processes, 'n_units', n_units, 'n_forkers', n_forkers, 'repetitions', repetitions)
+    time_level, time_below = 0, 0
+    for _ in range(repetitions):
+        if n_forkers:
+            dag = dag_utils.generate_random_forking(n_processes, n_units, n_forkers)
+        else:
+            dag = dag_utils.generate_random_nonforking(n_processes, n_units)
+        poset, unit_dict = dag_utils.poset_from_dag(dag)
+        units = [U for U in unit_dict.values() if U.parents]
+
+        start = time()
+        reference = [level_by_below(poset, U) for U in units]
+        time_below += time()-start
+
+        start = time()
+        for U in units:
+            U.level = None
+            poset.level(U)
+        time_level += time()-start
+
+        assert [U.level for U in units] == reference, "Levels computed from floor vectors differ from the reference."
+        assert all(U.level == dag.levels[node] for node, U in unit_dict.items()), "Levels differ from the ones in dag."
+
+    print('below-based level', round(time_below, 4), 'floor-vector level', round(time_level, 4))
+
+
+if __name__ == '__main__':
+    random.seed(123456789)
+    # the same configurations as in aleph/test/test_poset_level.py
+    measure_time(5, 50, 0, 1)
+    measure_time(30, 100, 0, 1)
+    measure_time(5, 50, 1, 30)
+    measure_time(30, 100, 2, 10)
+    # and a larger committee
+    measure_time(128, 1000, 0, 1)
@@ -0,0 +1,76 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import random
+import tempfile
+from time import time
+
+from aleph.data_structures import Poset, Unit, encode_units, decode_units
+from aleph.actions import create_unit, dehash_parents
+
+
+def replay(n_processes, data):
+    '''
+    Restores a poset the way a restarted process without a snapshot would: by decoding its units and adding them one by one.
+    '''
+    poset = Poset(n_processes, use_tcoin = False)
+    for U in decode_units(data):
+        dehash_parents(poset, U)
+        poset.prepare_unit(U)
+        poset.add_unit(U)
+    return poset
+
+
+def measure(n_processes, n_rounds, n_repetitions = 5):
+    '''
+    Builds a poset with signed units and compares restoring it from a snapshot with replaying all its units.
+    '''
+    poset = Poset(n_processes, use_tcoin = False)
+    for process_id in range(n_processes):
+        U = Unit(process_id, [], [])
+        U.signature = os.urandom(64)
+        poset.prepare_unit(U)
+        poset.add_unit(U)
+    for _ in range(n_rounds):
+        for creator_id in random.sample(range(n_processes), n_processes):
+            U = create_unit(poset, creator_id, [])
+            if U is not None:
+                U.signature = os.urandom(64)
+                poset.prepare_unit(U)
+                poset.add_unit(U)
+    n_units = len(poset.units_as_added)
+
+    with tempfile.TemporaryDirectory() as dir_name:
+        file_name = os.path.join(dir_name, 'snapshot')
+        poset.write_snapshot(file_name)
+        snapshot_bytes = os.path.getsize(file_name)
+        start = time()
+        for _ in range(n_repetitions):
+            Poset(n_processes, use_tcoin = False).read_snapshot(file_name)
+        snapshot_time = (time()-start)/n_repetitions
+
+    data = encode_units(poset.units_as_added)
+    start = time()
+    for _ in range(n_repetitions):
+        replay(n_processes, data)
+    replay_time = (time()-start)/n_repetitions
+
+    print(f'n_processes {n_processes:4} n_units {n_units:6} snapshot {snapshot_bytes/n_units:.1f}B {snapshot_time:.3f}s '
+          f'replay {len(data)/n_units:.1f}B {replay_time:.3f}s')
+
+
+if __name__ == '__main__':
+    random.seed(123456789)
+    for n_processes in [16, 32, 64]:
+        measure(n_processes, 10)
@@ -11,11 +11,20 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
 
+from functools import reduce
 from time import time
 from tqdm import tqdm
 from random import randint, sample
 
 from aleph.crypto import ThresholdCoin, generate_keys
+from aleph.crypto.threshold_signatures import _lagrange_coefficients
+
+
+def combine_shares_naive(VK, shares):
+    # this is how shares were combined before Lagrange coefficients were cached and a multi-exponentiation was used
+    R = shares.keys()
+    return reduce(lambda x,y: x*y, [share ** VK.lagrange(R, i) for i, share in shares.items()], 1)
+
 
 n_parties, threshold = 1000, 667
 VK, SKs = generate_keys(n_parties, threshold)
@@ -23,9 +32,9 @@ VK, SKs = generate_keys(n_parties, threshold)
 dealer_id = randint(0, n_parties)
 TCs = [ThresholdCoin(dealer_id, pid, n_parties, threshold, SK, VK) for pid, SK  in enumerate(SKs)]
 
-n_examples = 1000
+n_examples = 10
 
-results, times_gen, times_combine = [], [], []
+results, times_gen, times_naive, times_cold, times_warm, times_coin = [], [], [], [], [], []
 
 for _ in tqdm(range(n_examples)):
     nonce = randint(0, 100000)
@@ -38,8 +47,28 @@ for _ in tqdm(range(n_examples)):
     _shares = {i:shares[i] for i in sample(range(n_parties), threshold)}
 
     start = time()
-    results.append(TCs[0].combine_coin_shares(_shares))
-    times_combine.append(time()-start)
-print('time needed for generating one share:', round(sum(times_gen)/len(times_gen)/1000, 4))
-print('time needed for combining shares', round(sum(times_combine)/len(times_combine), 4))
+    signature = combine_shares_naive(VK, _shares)
+    times_naive.append(time()-start)
+
+    # the first combine for a set of parties computes Lagrange coefficients, the next ones take them from the cache
+    _lagrange_coefficients.cache_clear()
+    start = time()
+    assert VK.combine_shares(_shares) == signature
+    times_cold.append(time()-start)
+
+    start = time()
+    assert VK.combine_shares(_shares) == signature
+    times_warm.append(time()-start)
+
+    start = time()
+    coin, correct = TCs[0].combine_coin_shares(_shares, str(nonce))
+    times_coin.append(time()-start)
+    assert correct
+    results.append(coin)
+
+print('time needed for generating one share:', round(sum(times_gen)/len(times_gen)/n_parties, 4))
+print('time needed for combining shares before:', round(sum(times_naive)/len(times_naive), 4))
+print('time needed for combining shares, coefficients not cached:', round(sum(times_cold)/len(times_cold), 4))
+print('time needed for combining shares, coefficients cached:', round(sum(times_warm)/len(times_warm), 4))
+print('time needed for combining and verifying shares, coefficients cached:', round(sum(times_coin)/len(times_coin), 4))
 print('mean value: ', sum(results)/len(results))
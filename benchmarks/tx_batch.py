@@ -0,0 +1,53 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import pickle
+import random
+import zlib
+from time import time
+
+from aleph.data_structures import Tx, TxBatch
+
+
+def measure(n_accounts, txpu, n_repetitions = 10):
+    '''
+    Compares the number of bytes per transaction and the time of decoding a unit's worth of transactions given as a pickled and zlib
+    compressed list (the former encoding of transactions in units) and as a TxBatch, with and without compression.
+    Accounts are 64 character hex public keys.
+    '''
+    accounts = ['%064x' % random.getrandbits(256) for _ in range(n_accounts)]
+    txs = [Tx(*random.sample(accounts, 2), random.randint(1, 30000)) for _ in range(txpu)]
+
+    encodings = [
+        ('pickle+zlib', lambda txs: zlib.compress(pickle.dumps(txs), level=4), lambda data: pickle.loads(zlib.decompress(data))),
+        ('batch',       lambda txs: TxBatch.from_txs(txs).to_bytes(),            lambda data: list(TxBatch.from_bytes(data))),
+        ('batch+zlib',  lambda txs: zlib.compress(TxBatch.from_txs(txs).to_bytes(), level=4),
+                                                                                 lambda data: list(TxBatch.from_bytes(zlib.decompress(data)))),
+    ]
+    results = []
+    for name, encode, decode in encodings:
+        data = encode(txs)
+        assert decode(data) == txs
+        start = time()
+        for _ in range(n_repetitions):
+            decode(data)
+        results.append(f'{name} {len(data)/txpu:.1f}B {1e6*(time()-start)/n_repetitions/txpu:.2f}us')
+    print(f'n_accounts {n_accounts:6} txpu {txpu:6} | ' + ' | '.join(results) + ' per tx')
+
+
+if __name__ == '__main__':
+    random.seed(123456789)
+    for n_accounts in [446, 100000]:
+        for txpu in [1, 10, 100, 1000, 10000]:
+            measure(n_accounts, txpu)
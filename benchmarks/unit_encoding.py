@@ -0,0 +1,69 @@
+'''
+    This is a Proof-of-Concept implementation of Aleph Zero consensus protocol.
+    Copyright (C) 2019 Aleph Zero Team
+    
+    This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+    This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+    
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import pickle
+import random
+from time import time
+
+from aleph.data_structures import Poset, Unit, encode_units, decode_units
+from aleph.actions import create_unit
+
+
+def decode_pickled_states(data):
+    # this is how units were received before encode_units was introduced
+    units = []
+    for state in pickle.loads(data):
+        U = Unit.__new__(Unit)
+        U.__setstate__(state)
+        units.append(U)
+    return units
+
+
+def measure(n_processes, n_rounds, n_repetitions = 10):
+    '''
+    Builds a poset with signed units and compares sending all its units as pickled states of units and with encode_units.
+    '''
+    poset = Poset(n_processes, use_tcoin = False)
+    for process_id in range(n_processes):
+        U = Unit(process_id, [], [])
+        U.signature = os.urandom(64)
+        poset.prepare_unit(U)
+        poset.add_unit(U)
+    for _ in range(n_rounds):
+        for creator_id in random.sample(range(n_processes), n_processes):
+            U = create_unit(poset, creator_id, [])
+            if U is not None:
+                U.signature = os.urandom(64)
+                poset.prepare_unit(U)
+                poset.add_unit(U)
+    units = poset.units_as_added
+
+    results = []
+    for encode, decode in [(lambda units: pickle.dumps([U.__getstate__() for U in units]), decode_pickled_states),
+                           (encode_units, decode_units)]:
+        data = encode(units)
+        start = time()
+        for _ in range(n_repetitions):
+            decode(data)
+        results.append((len(data)/len(units), 1e6*(time()-start)/n_repetitions/len(units)))
+
+    (pickle_bytes, pickle_time), (encode_bytes, encode_time) = results
+    print(f'n_processes {n_processes:4} n_units {len(units):6} pickle {pickle_bytes:.1f}B {pickle_time:.1f}us '
+          f'encode_units {encode_bytes:.1f}B {encode_time:.1f}us per unit')
+
+
+if __name__ == '__main__':
+    random.seed(123456789)
+    for n_processes in [16, 32, 64, 128]:
+        measure(n_processes, 10)
@@ -98,6 +98,7 @@ class ByzantineProcess(Process):
         logger.debug('created a forking unit')
         forking_unit.parents[0] = unit.parents[0]
         forking_unit.height = unit.height
+        forking_unit.invalidate_encoding()
         process.poset.prepare_unit(forking_unit)
         if not process.poset.check_compliance(forking_unit):
             return None